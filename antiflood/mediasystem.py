@@ -1,14 +1,62 @@
 # /antiflood/mediasystem.py
 import logging
-from telegram import Update
 from telegram.ext import ContextTypes
-from datetime import datetime, timezone, timedelta
+from database.settings_store import settings_store
+from database.immunity_store import immunity_store
+from antiflood.ratelimit import RateLimiter, TokenBucket, parse_policies, now_ms
+from antiflood.record import FloodRecord, flood_key
+from cache.expiring import ExpiringDict
+from outbound import submit
+from metrics import antiflood_decisions
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
 
-# Dizionari per tracciare tempi media e nuovi utenti
-last_media_time = {}
-warned_users = {}
-new_users_cooldown = {}  # user_id: join_time
-immune_users = set()  # Set per tracciare gli utenti immuni
+# Un solo record compatto per membro: flood_key(chat_id, user_id) -> FloodRecord
+flood_records = ExpiringDict(ttl=1800, name="flood_records")
+
+# Chiavi modificate dall'ultimo snapshot (vedi snapshot.py)
+dirty_flood_keys = set()
+
+# Budget dedicati per tipo di media (es. "sticker=bucket:3/60"), gli altri tipi condividono il cooldown del gruppo
+MEDIA_POLICIES = parse_policies(config.MEDIA_POLICIES)
+
+# Policy per valore di cooldown configurato (lo stato vive nei FloodRecord, non nel limiter)
+_limiters = {}
+
+def limiter_for(media_cooldown: int) -> RateLimiter:
+    limiter = _limiters.get(media_cooldown)
+    if limiter is None:
+        limiter = _limiters[media_cooldown] = RateLimiter(
+            default=TokenBucket(capacity=1, refill_seconds=media_cooldown),
+            per_kind=MEDIA_POLICIES
+        )
+    return limiter
+
+def _record_ttl(settings) -> float:
+    """Un record serve finché vale il blocco nuovi utenti o il budget non è tornato pieno"""
+    return max(settings.new_user_window, limiter_for(settings.media_cooldown).idle_ms() / 1000, 1)
+
+def mark_joined(chat_id: int, user_id: int):
+    """Registra l'ingresso di un nuovo membro (blocco media per new_user_window secondi)"""
+    settings = settings_store.get(chat_id)
+    record = FloodRecord()
+    record.joined_at = now_ms()
+    key = flood_key(chat_id, user_id)
+    flood_records.set(key, record, ttl=_record_ttl(settings))
+    dirty_flood_keys.add(key)
+
+def media_kind(msg) -> str:
+    if msg.photo:
+        return "photo"
+    if msg.video:
+        return "video"
+    if msg.animation:
+        return "animation"
+    if msg.sticker:
+        return "sticker"
+    return None
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,64 +64,61 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def on_media_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    msg = update.message
-    user = msg.from_user
-    chat = msg.chat
-
-    if chat.type not in ("group", "supergroup") or not user:
-        return
-
+async def flood_rule(message_ctx, context: ContextTypes.DEFAULT_TYPE):
+    """Regola antiflood della pipeline messaggi: solo per i media (message_ctx.kind non None)"""
+    msg = message_ctx.message
+    user = message_ctx.user
+    chat = message_ctx.chat
+    kind = message_ctx.kind
     user_id = user.id
 
-    # Controlla se l'utente è immune
-    if user_id in immune_users:
+    # Controlla se l'utente è immune in questo gruppo
+    if immunity_store.is_immune(chat.id, user_id):
         logger.info(f"Utente {user_id} immune al sistema di cooldown.")
+        antiflood_decisions.inc("immune")
         return
 
-    if not (msg.photo or msg.video or msg.animation or msg.sticker):
+    settings = message_ctx.settings
+    now = now_ms()
+
+    # Un solo lookup per tutta la decisione
+    key = flood_key(chat.id, user_id)
+    record = flood_records.touch_get(key, ttl=_record_ttl(settings))
+    if record is None:
+        record = FloodRecord()
+        flood_records.set(key, record, ttl=_record_ttl(settings))
+    dirty_flood_keys.add(key)
+
+    # Controllo blocco per nuovi utenti (default 30 minuti)
+    # Cancellazioni e avvisi partono in background: l'handler non aspetta lo scheduler in uscita
+    if record.joined_at >= 0 and now - record.joined_at < settings.new_user_window * 1000:
+        submit(msg.delete(), "antiflood_delete")
+        logger.info(f"Media bloccato per nuovo utente {user_id}")
+        antiflood_decisions.inc("new_user")
+
+        if not record.warned:
+            submit(context.bot.send_message(
+                chat.id,
+                f"⏳ {user.first_name}, i nuovi utenti non possono inviare media per i primi {settings.new_user_window // 60} minuti!"
+            ), "antiflood_notice")
+            record.warned = True
         return
 
-    now = datetime.now(timezone.utc)
-
-    # Controllo blocco 30 minuti per nuovi utenti
-    join_time = new_users_cooldown.get(user_id)
-    if join_time:
-        elapsed = (now - join_time).total_seconds()
-        if elapsed < 1800:  # 30 minuti
-            try:
-                await msg.delete()
-                logger.info(f"Media bloccato per nuovo utente {user_id}")
-                
-                if not warned_users.get(user_id, False):
-                    await context.bot.send_message(
-                        chat.id,
-                        f"⏳ {user.first_name}, i nuovi utenti non possono inviare media per i primi 30 minuti!"
-                    )
-                    warned_users[user_id] = True
-                return
-            except Exception as e:
-                logger.error(f"Errore cancellazione media: {e}")
-                return
-
-    # Sistema cooldown normale (1 minuto)
-    last = last_media_time.get(user_id)
-    if last and (now - last).total_seconds() < 60:
-        try:
-            await msg.delete()
-            logger.info(f"Media eliminato per cooldown {user_id}")
-        except Exception as e:
-            logger.error(f"Errore cancellazione media: {e}")
-        
-        if not warned_users.get(user_id, False):
-            await context.bot.send_message(
+    # Sistema cooldown normale (default 1 minuto, budget per tipo se configurato)
+    if not limiter_for(settings.media_cooldown).allow_record(record, kind, now):
+        submit(msg.delete(), "antiflood_delete")
+        logger.info(f"Media eliminato per cooldown {user_id}")
+        antiflood_decisions.inc("cooldown")
+
+        if not record.warned:
+            submit(context.bot.send_message(
                 chat.id,
-                f"⚠️ {user.first_name}, puoi inviare media solo ogni 1 minuto!"
-            )
-            warned_users[user_id] = True
+                f"⚠️ {user.first_name}, puoi inviare media solo ogni {settings.media_cooldown} secondi!"
+            ), "antiflood_notice")
+            record.warned = True
         return
 
     # Resetta i warning se tutto ok
-    last_media_time[user_id] = now
-    warned_users[user_id] = False
+    record.warned = False
+    antiflood_decisions.inc("allowed")
     logger.debug(f"Media permesso a {user_id}")
@@ -0,0 +1,161 @@
+# /antiflood/ratelimit.py
+"""
+Motore di rate limiting per l'antiflood.
+
+Le policy (token bucket o finestra scorrevole) non hanno stato: lo stato di ogni
+chiave vive in un BucketState, così ogni controllo costa O(1) e un solo lookup.
+I tempi sono interi in millisecondi dell'orologio monotono (vedi now_ms).
+"""
+import time
+
+
+# Spostamento fisso: gli istanti restano positivi anche se ripristinati da uno snapshot
+# dopo un riavvio della macchina (quando l'orologio monotono riparte da zero)
+_EPOCH_MS = 10 ** 12
+
+
+def now_ms() -> int:
+    return time.monotonic_ns() // 1_000_000 + _EPOCH_MS
+
+
+class BucketState:
+    """Stato di una chiave: gettoni (o conteggio della finestra corrente), istante di riferimento e finestra precedente"""
+    __slots__ = ("tokens", "stamp", "prev")
+
+    def __init__(self):
+        self.tokens = 0.0
+        self.stamp = -1  # -1 = mai usato
+        self.prev = 0
+
+
+class TokenBucket:
+    """`capacity` gettoni, uno ricaricato ogni `refill_seconds` secondi"""
+    __slots__ = ("capacity", "refill_ms")
+
+    def __init__(self, capacity: int, refill_seconds: float):
+        if capacity < 1 or refill_seconds < 0:
+            raise ValueError("Token bucket non valido")
+        self.capacity = capacity
+        self.refill_ms = refill_seconds * 1000
+
+    def _tokens(self, state: BucketState, now: int) -> float:
+        if state.stamp < 0 or self.refill_ms == 0:
+            return self.capacity
+        return min(self.capacity, state.tokens + (now - state.stamp) / self.refill_ms)
+
+    def allow(self, state: BucketState, now: int) -> bool:
+        stamp = state.stamp
+        if stamp < 0 or not self.refill_ms:
+            tokens = self.capacity
+        else:
+            tokens = state.tokens + (now - stamp) / self.refill_ms
+            if tokens > self.capacity:
+                tokens = self.capacity
+        state.stamp = now
+        if tokens >= 1:
+            state.tokens = tokens - 1
+            return True
+        state.tokens = tokens
+        return False
+
+    def retry_after_ms(self, state: BucketState, now: int) -> int:
+        """Millisecondi prima che sia disponibile un gettone"""
+        tokens = self._tokens(state, now)
+        if tokens >= 1:
+            return 0
+        return int((1 - tokens) * self.refill_ms) + 1
+
+    def idle_ms(self) -> int:
+        """Dopo questo tempo senza uso lo stato equivale a uno nuovo e può essere scartato"""
+        return int(self.capacity * self.refill_ms)
+
+
+class SlidingWindow:
+    """Al massimo `limit` eventi in `window_seconds` secondi (contatore a finestra scorrevole approssimata)"""
+    __slots__ = ("limit", "window_ms")
+
+    def __init__(self, limit: int, window_seconds: float):
+        if limit < 1 or window_seconds <= 0:
+            raise ValueError("Finestra scorrevole non valida")
+        self.limit = limit
+        self.window_ms = int(window_seconds * 1000)
+
+    def _roll(self, state: BucketState, now: int) -> int:
+        start = now - now % self.window_ms
+        stamp = state.stamp
+        if stamp != start:
+            # Confronto per intervallo: uno stato ripristinato da uno snapshot non è allineato alle finestre
+            if stamp < start:
+                state.prev = int(state.tokens) if stamp >= start - self.window_ms else 0
+                state.tokens = 0
+            state.stamp = start
+        return start
+
+    def allow(self, state: BucketState, now: int) -> bool:
+        start = self._roll(state, now)
+        weight = (self.window_ms - (now - start)) / self.window_ms
+        if state.prev * weight + state.tokens < self.limit:
+            state.tokens += 1
+            return True
+        return False
+
+    def retry_after_ms(self, state: BucketState, now: int) -> int:
+        start = self._roll(state, now)
+        if state.prev * (self.window_ms - (now - start)) / self.window_ms + state.tokens < self.limit:
+            return 0
+        return start + self.window_ms - now
+
+    def idle_ms(self) -> int:
+        return 2 * self.window_ms
+
+
+def parse_policies(spec: str) -> dict:
+    """
+    "sticker=bucket:3/60,video=window:2/300" -> {"sticker": TokenBucket(3, 60), "video": SlidingWindow(2, 300)}
+    bucket:N/S = N gettoni, uno ricaricato ogni S secondi; window:N/S = N eventi ogni S secondi.
+    """
+    policies = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        kind, _, rule = item.partition("=")
+        name, _, params = rule.partition(":")
+        amount, _, seconds = params.partition("/")
+        if name == "bucket":
+            policies[kind.strip()] = TokenBucket(int(amount), float(seconds))
+        elif name == "window":
+            policies[kind.strip()] = SlidingWindow(int(amount), float(seconds))
+        else:
+            raise ValueError(f"Policy sconosciuta: {item}")
+    return policies
+
+
+class RateLimiter:
+    """
+    Policy antiflood per chiave (chat_id, user_id). I tipi con una policy dedicata in `per_kind`
+    hanno un budget separato, tutti gli altri condividono la policy `default`.
+    Lo stato non vive nel limiter ma nei FloodRecord (vedi antiflood.record).
+    """
+
+    def __init__(self, default, per_kind: dict = None):
+        self.default = default
+        self.per_kind = per_kind or {}
+
+    def allow_record(self, record, kind: str, now: int) -> bool:
+        """
+        Il budget condiviso usa il record stesso, quelli per tipo di media
+        stanno in record.kinds (vedi antiflood.record.FloodRecord).
+        """
+        policy = self.per_kind.get(kind)
+        if policy is None:
+            return self.default.allow(record, now)
+
+        kinds = record.kinds
+        if kinds is None:
+            kinds = record.kinds = {}
+        state = kinds.get(kind)
+        if state is None:
+            state = kinds[kind] = BucketState()
+        return policy.allow(state, now)
+
+    def idle_ms(self) -> int:
+        """Tempo dopo cui lo stato di una chiave inutilizzata equivale a uno nuovo"""
+        return max(policy.idle_ms() for policy in (self.default, *self.per_kind.values()))
@@ -0,0 +1,37 @@
+# /antiflood/record.py
+from cache.expiring import ExpiringEntry
+
+_KEY_MASK = (1 << 64) - 1
+
+
+def flood_key(chat_id: int, user_id: int) -> int:
+    """Chiave (chat_id, user_id) impacchettata in un solo intero (più piccola di una tupla)"""
+    return ((chat_id & _KEY_MASK) << 64) | user_id
+
+
+def split_flood_key(key: int):
+    chat_id = key >> 64
+    if chat_id >= 1 << 63:
+        chat_id -= 1 << 64
+    return chat_id, key & _KEY_MASK
+
+
+class FloodRecord(ExpiringEntry):
+    """
+    Stato antiflood compatto di un membro in un gruppo, salvato direttamente come voce di ExpiringDict.
+    tokens/stamp/prev sono lo stato del budget condiviso (come BucketState, stamp = ultimo media),
+    gli istanti sono interi in ms dell'orologio monotono (antiflood.ratelimit.now_ms).
+    """
+    __slots__ = ("tokens", "stamp", "prev", "joined_at", "warned", "kinds")
+
+    def __init__(self):
+        self.tokens = 0.0
+        self.stamp = -1
+        self.prev = 0
+        self.joined_at = -1  # -1 = ingresso non osservato
+        self.warned = False
+        self.kinds = None    # tipo di media -> BucketState, solo se ci sono budget dedicati
+
+    @property
+    def value(self):
+        return self
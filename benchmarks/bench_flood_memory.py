@@ -0,0 +1,73 @@
+# /benchmarks/bench_flood_memory.py
+# Uso: python benchmarks/bench_flood_memory.py [--members 1000000]
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime, timezone, timedelta
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from antiflood.record import FloodRecord, flood_key
+from cache.expiring import ExpiringDict
+
+CHATS = 50
+
+def measure(name: str, build, members: int):
+    gc.collect()
+    tracemalloc.start()
+    keep = build(members)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<44} {current / 2**20:8.1f} MiB  {current / members:6.0f} byte/membro")
+    del keep
+    gc.collect()
+
+def dicts_of_datetimes(members: int):
+    """Layout originale: quattro dizionari con datetime timezone-aware"""
+    base = datetime.now(timezone.utc)
+    last_media_time, warned_users, new_users_cooldown = {}, {}, {}
+    for i in range(members):
+        key = (-(1000 + i % CHATS), i)
+        last_media_time[key] = base + timedelta(microseconds=i)
+        warned_users[key] = bool(i & 1)
+        new_users_cooldown[key] = base - timedelta(microseconds=i)
+    return last_media_time, warned_users, new_users_cooldown
+
+def expiring_dicts(members: int):
+    """Layout intermedio: mappe con scadenza separate per avvisi e ingressi, più lo stato del limiter"""
+    from antiflood.ratelimit import BucketState
+    base = datetime.now(timezone.utc)
+    warned_users, new_users_cooldown, states = ExpiringDict(3600), ExpiringDict(3600), ExpiringDict(3600)
+    for i in range(members):
+        key = (-(1000 + i % CHATS), i)
+        state = BucketState()
+        state.stamp = 1_700_000_000 + i
+        state.tokens = 0.5
+        states.set(key, state)
+        warned_users.set(key, bool(i & 1))
+        new_users_cooldown.set(key, base - timedelta(microseconds=i))
+    return warned_users, new_users_cooldown, states
+
+def records_expiring(members: int):
+    """Layout attuale: un FloodRecord per membro, voce diretta di ExpiringDict con chiave impacchettata"""
+    records = ExpiringDict(ttl=3600)
+    for i in range(members):
+        record = FloodRecord()
+        record.stamp = 1_700_000_000 + i
+        record.tokens = 0.5
+        record.joined_at = 1_700_000_000 - i
+        record.warned = bool(i & 1)
+        records.set(flood_key(-(1000 + i % CHATS), i), record)
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria per membro tracciato dall'antiflood")
+    parser.add_argument("--members", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    measure("dizionari di datetime (layout originale)", dicts_of_datetimes, args.members)
+    measure("ExpiringDict separate + BucketState", expiring_dicts, args.members)
+    measure("FloodRecord in ExpiringDict", records_expiring, args.members)
+
+if __name__ == "__main__":
+    main()
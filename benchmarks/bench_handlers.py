@@ -0,0 +1,204 @@
+# /benchmarks/bench_handlers.py
+# Throughput degli handler registrati da setup_handlers, senza rete: l'Application vera
+# usa un finto livello HTTP (FakeRequest) che risponde alla Bot API con dati preconfezionati.
+# Uso: python benchmarks/bench_handlers.py [--updates 20000] [--latency 20] [--mix text=60,media=20,premium=10,join=5,command=5]
+#      [--rate-limiter] [--no-alloc]
+# Senza DATABASE_URL usa un database SQLite temporaneo.
+import argparse
+import asyncio
+import logging
+import random
+import time
+import tracemalloc
+import sys
+import os
+# Benvenuto inviato subito dall'handler, così il suo costo resta attribuito a welcome_command
+os.environ.setdefault("WELCOME_BATCH_DELAY", "0")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fake_bot import FakeRequest, OWNER_ID, user_dict, percentile, build_application, startup, shutdown, drive
+from telegram import Update
+from config import config
+from database.settings_store import settings_store
+
+CHATS = 50
+USERS = 5000
+DEFAULT_MIX = "text=60,media=20,premium=10,join=5,command=5"
+
+
+def parse_mix(spec: str) -> list:
+    """"text=60,media=20" -> [("text", 60), ("media", 20)]"""
+    mix = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, weight = item.partition("=")
+        if kind not in BUILDERS:
+            raise ValueError(f"Tipo di update sconosciuto: {kind}")
+        mix.append((kind, float(weight or 1)))
+    return mix
+
+
+def _message(update_id: int, rng: random.Random, **fields) -> dict:
+    chat_id = -(1000 + rng.randrange(CHATS))
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "supergroup", "title": f"Gruppo {chat_id}"},
+        "from": user_dict(10_000 + rng.randrange(USERS)),
+    }
+    message.update(fields)
+    return {"update_id": update_id, "message": message}
+
+def _text(update_id, rng):
+    return _message(update_id, rng, text="ciao a tutti")
+
+def _media(update_id, rng):
+    return _message(update_id, rng, photo=[{"file_id": "p", "file_unique_id": "p", "width": 1, "height": 1}])
+
+def _premium(update_id, rng):
+    data = _message(update_id, rng, text="messaggio premium")
+    data["message"]["from"] = user_dict(500_000 + rng.randrange(USERS), premium=True)
+    return data
+
+def _join(update_id, rng):
+    member = user_dict(900_000 + update_id)
+    data = _message(update_id, rng, new_chat_members=[member])
+    data["message"]["from"] = member
+    return data
+
+def _command(update_id, rng):
+    return _message(update_id, rng, text="/limiti", entities=[{"type": "bot_command", "offset": 0, "length": 7}],
+                    **{"from": user_dict(OWNER_ID)})
+
+BUILDERS = {"text": _text, "media": _media, "premium": _premium, "join": _join, "command": _command}
+
+
+def build_updates(bot, count: int, mix: list, seed: int, first_id: int = 1) -> list:
+    """Lista di (tipo, Update) estratti secondo i pesi del mix"""
+    rng = random.Random(seed)
+    kinds = [kind for kind, _ in mix]
+    weights = [weight for _, weight in mix]
+    return [
+        (kind, Update.de_json(BUILDERS[kind](update_id, rng), bot))
+        for update_id, kind in enumerate(rng.choices(kinds, weights, k=count), start=first_id)
+    ]
+
+
+class HandlerProbe:
+    """Avvolge le callback registrate: campioni di durata e allocazioni per handler"""
+
+    def __init__(self, app, allocations: bool):
+        self.allocations = allocations
+        self.samples = {}   # nome -> [secondi]
+        self.allocated = {} # nome -> byte allocati (picco durante la callback) sommati
+        for handlers in app.handlers.values():
+            for handler in handlers:
+                handler.callback = self._wrap(handler.callback)
+
+    def _wrap(self, callback):
+        name = getattr(callback, "__qualname__", type(callback).__name__)
+        samples = self.samples.setdefault(name, [])
+        self.allocated.setdefault(name, 0)
+
+        async def probe(update, context):
+            if self.allocations and tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                samples.append(time.perf_counter() - started)
+                if self.allocations and tracemalloc.is_tracing():
+                    self.allocated[name] += tracemalloc.get_traced_memory()[1] - base
+
+        return probe
+
+    def report(self, allocations: bool):
+        print(f"{'handler':<34} {'chiamate':>9} {'p50 ms':>8} {'p99 ms':>8} {'totale s':>9}" + ("  byte/update" if allocations else ""))
+        for name, samples in sorted(self.samples.items(), key=lambda item: -sum(item[1])):
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            line = (f"{name:<34} {len(samples):>9} {percentile(ordered, 0.5) * 1000:8.3f} "
+                    f"{percentile(ordered, 0.99) * 1000:8.3f} {sum(samples):9.3f}")
+            if allocations:
+                line += f"  {self.allocated[name] / len(samples):11,.0f}"
+            print(line)
+
+
+async def run_concurrent(app, updates: list):
+    elapsed, latencies = await drive(app, [update for _, update in updates])
+    print(f"{len(updates)} update in {elapsed:.2f}s ({len(updates) / elapsed:,.0f} update/s, "
+          f"{config.MAX_CONCURRENT_UPDATES} in parallelo)")
+    print(f"latenza update: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+
+
+async def run_sequential(app, updates: list, allocations: bool) -> float:
+    """Un update alla volta: durate per handler e per tipo senza interferenze tra task (e con tracemalloc se richiesto)"""
+    per_kind = {}
+    if allocations:
+        tracemalloc.start()
+    started = time.perf_counter()
+    for kind, update in updates:
+        update_started = time.perf_counter()
+        await app.process_update(update)
+        per_kind.setdefault(kind, []).append(time.perf_counter() - update_started)
+    elapsed = time.perf_counter() - started
+    if allocations:
+        tracemalloc.stop()
+
+    print(f"\npassaggio sequenziale: {len(updates)} update in {elapsed:.2f}s "
+          f"({len(updates) / elapsed:,.0f} update/s{', con tracemalloc' if allocations else ''})")
+    print(f"{'tipo di update':<34} {'update':>9} {'p50 ms':>8} {'p99 ms':>8} {'totale s':>9}")
+    for kind, samples in sorted(per_kind.items()):
+        ordered = sorted(samples)
+        print(f"{kind:<34} {len(samples):>9} {percentile(ordered, 0.5) * 1000:8.3f} "
+              f"{percentile(ordered, 0.99) * 1000:8.3f} {sum(samples):9.3f}")
+    print()
+    return elapsed
+
+
+async def main_async(args):
+    fake = FakeRequest(latency=args.latency / 1000)
+    app = build_application(fake, rate_limiter=args.rate_limiter)
+    probe = HandlerProbe(app, allocations=not args.no_alloc)
+    await startup()
+    # Controllo premium attivo in tutti i gruppi, altrimenti la regola premium esce subito
+    for i in range(CHATS):
+        await settings_store.set(-(1000 + i), "premium_check", True)
+
+    mix = parse_mix(args.mix)
+    async with app:
+        await app.start()
+        updates = build_updates(app.bot, args.updates, mix, args.seed)
+        print(f"mix: {', '.join(f'{kind}={weight:g}' for kind, weight in mix)}; latenza API {args.latency:g} ms")
+        await run_concurrent(app, updates)
+
+        # Secondo passaggio sequenziale con update nuovi (stessa distribuzione) per le misure per handler
+        for samples in probe.samples.values():
+            samples.clear()
+        sequential = build_updates(app.bot, args.sequential, mix, args.seed + 1, first_id=args.updates + 1)
+        await run_sequential(app, sequential, allocations=not args.no_alloc)
+        probe.report(allocations=not args.no_alloc)
+        print(f"\nchiamate API: {dict(sorted(fake.calls.items(), key=lambda item: -item[1]))}")
+        await app.stop()
+
+    await shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark degli handler con una finta Bot API in-process")
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--sequential", type=int, default=5_000, help="update del passaggio sequenziale per handler")
+    parser.add_argument("--latency", type=float, default=20.0, help="ms di latenza simulata per chiamata API")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rate-limiter", action="store_true", help="usa lo scheduler in uscita reale (limiti Telegram)")
+    parser.add_argument("--no-alloc", action="store_true", help="non misurare le allocazioni (tracemalloc)")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# /benchmarks/bench_ratelimit.py
+# Costo del controllo antiflood come in flood_rule: lookup del FloodRecord per flood_key, poi allow_record.
+# I media arrivano da un insieme di membri attivi (--members per gruppo), così i record vengono riusati
+# e il ramo di rifiuto viene esercitato; creazione dei record e controlli a regime sono misurati a parte.
+# Uso: python benchmarks/bench_ratelimit.py [--checks 5000000] [--members 200] [--chats 50] [--rate 1000]
+import argparse
+import random
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from antiflood.ratelimit import RateLimiter, TokenBucket, SlidingWindow
+from antiflood.record import FloodRecord, flood_key
+from cache.expiring import ExpiringDict
+
+KINDS = ("photo", "video", "animation", "sticker")
+
+def run(name: str, limiter: RateLimiter, checks: int, members: int, chats: int, rate: int):
+    rng = random.Random(42)
+    keys = [flood_key(-1_000_000_000_000 - chat, user) for chat in range(chats) for user in range(members)]
+    # Eventi pre-generati (chiave, tipo, ms dall'inizio) per misurare solo il costo del controllo
+    events = [
+        (keys[rng.randrange(len(keys))], KINDS[rng.randrange(4)], i * 1000 // rate)
+        for i in range(min(checks, 1_000_000))
+    ]
+    span = events[-1][2] + 1
+    ttl = max(limiter.idle_ms() / 1000, 1)
+    records = ExpiringDict(ttl=ttl)
+    touch_get, store = records.touch_get, records.set
+    allow_record = limiter.allow_record
+
+    # Creazione dei record (primo media di ogni membro)
+    start = time.perf_counter()
+    for key in keys:
+        record = touch_get(key, ttl)
+        if record is None:
+            record = FloodRecord()
+            store(key, record, ttl)
+    inserted = time.perf_counter() - start
+
+    # Controlli a regime: ogni lookup trova il record
+    allowed = 0
+    done = 0
+    base = 0
+    start = time.perf_counter()
+    while done < checks:
+        for key, kind, offset in events:
+            if allow_record(touch_get(key, ttl), kind, base + offset):
+                allowed += 1
+        done += len(events)
+        base += span
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<28} inserimento {inserted / len(keys) * 1e9:5.0f} ns/record ({len(keys)} record)  "
+        f"controlli {done:>9} in {elapsed:5.2f}s  {elapsed / done * 1e9:5.0f} ns/controllo  "
+        f"permessi {allowed / done:.1%}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del rate limiter antiflood")
+    parser.add_argument("--checks", type=int, default=5_000_000)
+    parser.add_argument("--members", type=int, default=200, help="membri attivi per gruppo")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--rate", type=int, default=1000, help="media al secondo (tempo simulato)")
+    args = parser.parse_args()
+
+    options = (args.checks, args.members, args.chats, args.rate)
+    run("token bucket condiviso", RateLimiter(TokenBucket(1, 60)), *options)
+    run("finestra scorrevole", RateLimiter(SlidingWindow(5, 60)), *options)
+    run(
+        "budget per tipo di media",
+        RateLimiter(TokenBucket(1, 60), per_kind={"sticker": TokenBucket(3, 60), "video": SlidingWindow(2, 300)}),
+        *options
+    )
+
+if __name__ == "__main__":
+    main()
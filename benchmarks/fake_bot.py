@@ -0,0 +1,203 @@
+# /benchmarks/fake_bot.py
+# Finta Bot API in-process e Application vera costruita come in bot.py, per benchmark e replay offline.
+# Va importato prima dei moduli del bot: imposta le variabili d'ambiente mancanti (token finto,
+# SQLite temporaneo, metriche disattivate) e la directory di lavoro alla radice del progetto.
+import asyncio
+import json
+import tempfile
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Percorsi relativi del bot (es. image.jpg del benvenuto) come all'avvio dalla radice del progetto
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="fake_bot_")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("API_ID", "1")
+os.environ.setdefault("API_HASH", "bench")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ["RECORD_UPDATES_PATH"] = ""  # mai registrare il traffico sintetico
+
+from telegram.request import BaseRequest
+from telegram.ext import Application
+from handlers import setup_handlers
+from concurrency import ChatSequencer
+from outbound import outbound_scheduler, drain_background
+from config import config
+from database.db_manager import create_missing_tables, dispose_async_engine
+from database.settings_store import settings_store
+from database.immunity_store import immunity_store
+from database.boost_index import boost_index
+from database.premium_cache import premium_writes
+from database.warn_ledger import warn_ledger
+from deletions import deletion_scheduler
+
+BOT_ID = 123456
+OWNER_ID = 1
+
+
+def user_dict(user_id: int, premium: bool = False) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"Utente{user_id}"}
+    if premium:
+        user["is_premium"] = True
+    return user
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """`samples` già ordinati"""
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else 0.0
+
+
+class FakeRequest(BaseRequest):
+    """
+    Finta Bot API in-process: risposte preconfezionate dopo `latency` secondi.
+    Conta le chiamate per metodo e registra le azioni di moderazione in `decisions`.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = {}
+        self.decisions = []  # (azione, chat_id, user_id o message_id)
+        self._message_id = 1_000_000
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data is not None else {}
+        self._record_decision(endpoint, params)
+        result = self._result(endpoint, params)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    def _record_decision(self, endpoint: str, params: dict):
+        chat_id = params.get("chat_id")
+        if endpoint == "restrictChatMember":
+            permissions = params.get("permissions") or {}
+            if isinstance(permissions, str):
+                permissions = json.loads(permissions)
+            action = "unmute" if permissions.get("can_send_messages") else "mute"
+            self.decisions.append((action, chat_id, params.get("user_id")))
+        elif endpoint in ("banChatMember", "unbanChatMember"):
+            self.decisions.append(("ban" if endpoint == "banChatMember" else "unban", chat_id, params.get("user_id")))
+        elif endpoint == "deleteMessage":
+            self.decisions.append(("delete", chat_id, params.get("message_id")))
+        elif endpoint == "deleteMessages":
+            message_ids = params.get("message_ids") or []
+            if isinstance(message_ids, str):
+                message_ids = json.loads(message_ids)
+            self.decisions.extend(("delete", chat_id, message_id) for message_id in message_ids)
+
+    def _result(self, endpoint: str, params: dict):
+        if endpoint == "getMe":
+            return {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if endpoint == "getChatAdministrators":
+            return [{"status": "creator", "is_anonymous": False, "user": user_dict(OWNER_ID)}]
+        if endpoint == "getChatMember":
+            return {"status": "member", "user": user_dict(int(params.get("user_id", 0)))}
+        if endpoint == "getUserChatBoosts":
+            return {"boosts": []}
+        if endpoint == "getChat":
+            chat_id = int(params.get("chat_id", 0))
+            return {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup",
+                    "first_name": f"Utente{chat_id}", "accent_color_id": 0, "max_reaction_count": 11}
+        if endpoint.startswith(("send", "edit", "copy", "forward")):
+            self._message_id += 1
+            chat_id = int(params.get("chat_id", 0))
+            message = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+                "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"},
+            }
+            if endpoint == "sendPhoto":
+                message["photo"] = [{"file_id": "bench-photo", "file_unique_id": "bench", "width": 1, "height": 1}]
+            else:
+                message["text"] = str(params.get("text", params.get("caption", "")))
+            return message
+        return True
+
+
+def build_application(fake: FakeRequest, rate_limiter: bool = False) -> Application:
+    """Come main() in bot.py, ma con la finta Bot API e senza Updater (gli update si mettono in coda a mano)"""
+    builder = (
+        Application.builder()
+        .token(config.BOT_TOKEN)
+        .request(fake)
+        .get_updates_request(FakeRequest())
+        .updater(None)
+        .concurrent_updates(ChatSequencer(config.MAX_CONCURRENT_UPDATES))
+    )
+    if rate_limiter:
+        builder = builder.rate_limiter(outbound_scheduler)
+    app = builder.build()
+    setup_handlers(app)
+    return app
+
+
+async def startup():
+    """Come on_startup, senza client Pyrogram né job periodici"""
+    await create_missing_tables()
+    await settings_store.load()
+    await immunity_store.load()
+    await boost_index.load()
+    await deletion_scheduler.load()
+
+
+async def shutdown():
+    await premium_writes.flush()
+    await warn_ledger.flush()
+    await deletion_scheduler.flush()
+    await dispose_async_engine()
+
+
+async def drive(app: Application, updates: list, offsets: list = None):
+    """
+    Mette gli update nella coda dell'Application come farebbe l'Updater e aspetta che siano elaborati.
+    `offsets` (secondi dall'inizio, uno per update) regola i tempi di ingresso; senza, tutti subito.
+    Restituisce (secondi totali, latenze ordinate dall'ingresso a fine elaborazione).
+    """
+    enqueued = {}
+    latencies = []
+    done = asyncio.Event()
+    process_update = app.process_update
+
+    async def timed(update):
+        try:
+            await process_update(update)
+        finally:
+            latencies.append(time.perf_counter() - enqueued.pop(update.update_id))
+            if len(latencies) == len(updates):
+                done.set()
+
+    app.process_update = timed
+    started = time.perf_counter()
+    for index, update in enumerate(updates):
+        if offsets is not None:
+            wait = started + offsets[index] - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        enqueued[update.update_id] = time.perf_counter()
+        await app.update_queue.put(update)
+    if updates:
+        await done.wait()
+    # Cancellazioni e avvisi partiti con submit() fanno parte del lavoro dell'update
+    await drain_background()
+    elapsed = time.perf_counter() - started
+    app.process_update = process_update
+
+    latencies.sort()
+    return elapsed, latencies
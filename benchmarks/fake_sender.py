@@ -0,0 +1,118 @@
+# /benchmarks/fake_sender.py
+# Finto Telegram: invia update sintetici all'endpoint webhook con il segreto e misura le risposte.
+# Uso contro il bot avviato in modalità webhook:
+#   python benchmarks/fake_sender.py --url http://127.0.0.1:8443/telegram --secret $WEBHOOK_SECRET
+# Uso autonomo (server webhook in-process con un consumatore che svuota la coda):
+#   python benchmarks/fake_sender.py --self-test [--updates 20000] [--connections 40] [--queue 1000]
+import argparse
+import asyncio
+import json
+import time
+import urllib.parse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHATS = 50
+
+
+def fake_update(update_id: int) -> bytes:
+    chat_id = -(1000 + update_id % CHATS)
+    user_id = 10_000 + update_id % 5000
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup", "title": f"Gruppo {chat_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"Utente{user_id}"},
+            "text": "ciao",
+        },
+    }).encode()
+
+
+async def sender(host: str, port: int, path: str, secret: str, ids, statuses: dict, latencies: list):
+    """Una connessione keep-alive, come le max_connections di Telegram"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for update_id in ids:
+            body = fake_update(update_id)
+            started = time.perf_counter()
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            latencies.append(time.perf_counter() - started)
+            status = int(head.split(b" ", 2)[1])
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(url: str, secret: str, updates: int, connections: int):
+    parsed = urllib.parse.urlparse(url)
+    statuses, latencies = {}, []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        sender(parsed.hostname, parsed.port or 80, parsed.path or "/", secret,
+               range(i, updates, connections), statuses, latencies)
+        for i in range(connections)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"{updates} update in {elapsed:.2f}s ({updates / elapsed:,.0f}/s) su {connections} connessioni")
+    print(f"risposte: {dict(sorted(statuses.items()))}")
+    print(f"latenza ack: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+
+async def self_test(args):
+    from webhook import WebhookServer
+    queue = asyncio.Queue(maxsize=args.queue)
+    in_flight = [0]
+    server = WebhookServer(
+        bot=None, update_queue=queue, path="/telegram", secret="segreto",
+        max_backlog=args.queue, in_flight=lambda: in_flight[0]
+    )
+    await server.start("127.0.0.1", args.port)
+
+    async def work():
+        await asyncio.sleep(args.work / 1000)
+        in_flight[0] -= 1
+
+    async def consume():
+        # Come l'Application con update concorrenti: un task per update prelevato dalla coda
+        while True:
+            await queue.get()
+            in_flight[0] += 1
+            asyncio.create_task(work())
+
+    consumer = asyncio.create_task(consume())
+    await run(f"http://127.0.0.1:{args.port}/telegram", "segreto", args.updates, args.connections)
+    await run(f"http://127.0.0.1:{args.port}/telegram", "sbagliato", 10, 1)
+    consumer.cancel()
+    await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finto mittente di update per il webhook")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--connections", type=int, default=40)
+    parser.add_argument("--self-test", action="store_true")
+    parser.add_argument("--port", type=int, default=18443)
+    parser.add_argument("--queue", type=int, default=1000)
+    parser.add_argument("--work", type=float, default=0.0, help="ms di lavoro simulato per update (--self-test)")
+    args = parser.parse_args()
+
+    if args.self_test:
+        asyncio.run(self_test(args))
+    else:
+        asyncio.run(run(args.url, args.secret, args.updates, args.connections))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# /benchmarks/replay.py
+# Replay di traffico registrato (RECORD_UPDATES_PATH, vedi recorder.py) contro gli handler veri
+# con la finta Bot API di fake_bot.py: prestazioni e decisioni di moderazione.
+# Uso:
+#   python benchmarks/replay.py traffico.jsonl [--speed 1] [--latency 20] [--report base.json]
+#   python benchmarks/replay.py traffico.jsonl --speed 0 --baseline base.json   # confronto con una build precedente
+# --speed 1 = tempo reale, N = N volte più veloce, 0 = il più veloce possibile.
+# Le decisioni dipendono dai tempi (cooldown, finestra nuovi utenti): si confrontano run alla stessa velocità.
+import argparse
+import asyncio
+import json
+import logging
+from collections import Counter
+import sys
+import os
+# Benvenuti inviati subito: i job di raggruppamento partirebbero dopo la fine del replay
+os.environ.setdefault("WELCOME_BATCH_DELAY", "0")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fake_bot import FakeRequest, percentile, build_application, startup, shutdown, drive
+from telegram import Update
+from database.settings_store import settings_store
+from metrics import antiflood_decisions
+
+ANTIFLOOD_OUTCOMES = ("allowed", "cooldown", "new_user", "immune")
+
+
+def load_recording(path: str, limit: int = None) -> list:
+    """Righe {"t": secondi, "update": {...}} ordinate per tempo di arrivo"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+            if limit and len(entries) >= limit:
+                break
+    entries.sort(key=lambda entry: entry["t"])
+    return entries
+
+
+def _chat_ids(entries: list) -> set:
+    chats = set()
+    for entry in entries:
+        message = entry["update"].get("message") or entry["update"].get("edited_message")
+        if message and message["chat"]["id"] < 0:
+            chats.add(message["chat"]["id"])
+    return chats
+
+
+async def replay(args) -> dict:
+    entries = load_recording(args.recording, args.limit)
+    fake = FakeRequest(latency=args.latency / 1000)
+    app = build_application(fake, rate_limiter=args.rate_limiter)
+    await startup()
+    if args.premium_check:
+        for chat_id in _chat_ids(entries):
+            await settings_store.set(chat_id, "premium_check", True)
+
+    async with app:
+        await app.start()
+        updates = [Update.de_json(entry["update"], app.bot) for entry in entries]
+        offsets = [entry["t"] / args.speed for entry in entries] if args.speed > 0 else None
+        elapsed, latencies = await drive(app, updates, offsets)
+        await app.stop()
+    await shutdown()
+
+    decisions = sorted(fake.decisions, key=lambda decision: tuple(str(part) for part in decision))
+    return {
+        "recording": args.recording,
+        "speed": args.speed,
+        "updates": len(updates),
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(len(updates) / elapsed, 1) if elapsed else 0,
+        "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "api_calls": dict(sorted(fake.calls.items())),
+        "antiflood": {outcome: antiflood_decisions.value(outcome) for outcome in ANTIFLOOD_OUTCOMES},
+        "actions": dict(sorted(Counter(decision[0] for decision in decisions).items())),
+        "decisions": [list(decision) for decision in decisions],
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['updates']} update in {report['seconds']:.2f}s ({report['updates_per_second']:,.0f} update/s, "
+          f"velocità {report['speed'] or 'massima'})")
+    print(f"latenza update: p50 {report['latency_p50_ms']:.2f} ms, p99 {report['latency_p99_ms']:.2f} ms")
+    print(f"antiflood: {report['antiflood']}")
+    print(f"azioni di moderazione: {report['actions']}")
+    print(f"chiamate API: {report['api_calls']}")
+
+
+def compare(baseline: dict, candidate: dict):
+    print(f"\nconfronto con {baseline['recording']} (velocità {baseline['speed'] or 'massima'})")
+    for key, label in (("updates_per_second", "update/s"), ("latency_p50_ms", "p50 ms"), ("latency_p99_ms", "p99 ms")):
+        before, after = baseline[key], candidate[key]
+        change = f"{(after - before) / before:+.1%}" if before else "n/d"
+        print(f"  {label:<10} {before:>10,.2f} -> {after:>10,.2f}  ({change})")
+    for section in ("antiflood", "actions"):
+        keys = sorted(set(baseline[section]) | set(candidate[section]))
+        for key in keys:
+            before, after = baseline[section].get(key, 0), candidate[section].get(key, 0)
+            if before != after:
+                print(f"  {section}.{key}: {before} -> {after}")
+
+    # Differenze tra le decisioni come multinsiemi (azione, chat, utente/messaggio)
+    before = Counter(tuple(decision) for decision in baseline["decisions"])
+    after = Counter(tuple(decision) for decision in candidate["decisions"])
+    only_before, only_after = before - after, after - before
+    if not only_before and not only_after:
+        print("  decisioni identiche")
+        return
+    print(f"  decisioni solo nella baseline: {sum(only_before.values())}, solo nella candidata: {sum(only_after.values())}")
+    for decision in list(only_before.elements())[:10]:
+        print(f"    - {decision}")
+    for decision in list(only_after.elements())[:10]:
+        print(f"    + {decision}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay di traffico registrato con una finta Bot API in-process")
+    parser.add_argument("recording", help="file JSONL prodotto da RECORD_UPDATES_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = tempo reale, N = N volte più veloce, 0 = massima")
+    parser.add_argument("--latency", type=float, default=20.0, help="ms di latenza simulata per chiamata API")
+    parser.add_argument("--limit", type=int, default=None, help="solo i primi N update")
+    parser.add_argument("--premium-check", action="store_true", help="attiva il controllo premium nei gruppi registrati")
+    parser.add_argument("--rate-limiter", action="store_true", help="usa lo scheduler in uscita reale (limiti Telegram)")
+    parser.add_argument("--report", help="salva il report (JSON) per confronti futuri")
+    parser.add_argument("--baseline", help="report di una build precedente da confrontare")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    if args.speed < 0:
+        parser.error("--speed non può essere negativa")
+
+    logging.getLogger().setLevel(args.log_level)
+    report = asyncio.run(replay(args))
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,103 @@
 import os
+import asyncio
 import logging
 from dotenv import load_dotenv
+from telegram import Update
 from telegram.ext import Application
 from handlers import setup_handlers
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
+from database.db_manager import dispose_async_engine, create_missing_tables
+from database.settings_store import settings_store
+from database.immunity_store import immunity_store
+from database.boost_index import boost_index
+from database.premium_cache import premium_writes, flush_premium_writes
+from utils import start_resolver, stop_resolver
+from cache.user_directory import user_directory, flush_user_directory
+from cache.expiring import sweep_expiring_maps
+from database.warn_ledger import warn_ledger, flush_warn_ledger
+from snapshot import state_snapshot, save_state_snapshot
+from deletions import deletion_scheduler, process_deletions
+from concurrency import ChatSequencer
+from outbound import outbound_scheduler
+from webhook import run_webhook
+from metrics import metrics_server, start_metrics_server
+from recorder import traffic_recorder, flush_traffic_recording
+from profiler import profiler
 
 TOKEN = config.BOT_TOKEN
 
+async def on_startup(app: Application):
+    await create_missing_tables()
+    # Endpoint delle metriche (handler, Bot API, DB, antiflood)
+    await start_metrics_server()
+    # Profilazione degli handler dal primo update (si ferma e riparte con /profile)
+    if config.PROFILE_ENABLED:
+        profiler.start()
+    # Ripristina lo stato antiflood dall'ultimo snapshot
+    await state_snapshot.load()
+    # Snapshot delle impostazioni per gruppo: le letture sul percorso dei messaggi non toccano il DB
+    await settings_store.load()
+    # Utenti immuni all'antiflood, per gruppo
+    await immunity_store.load()
+    # Boost attivi per gruppo (aggiornati poi dagli update chat_boost)
+    await boost_index.load()
+    # Cancellazioni di messaggi rimaste in sospeso prima del riavvio
+    await deletion_scheduler.load()
+    # Client MTProto condiviso per la risoluzione degli username
+    try:
+        await start_resolver()
+    except Exception as e:
+        # Verrà riavviato alla prima risoluzione
+        logging.getLogger(__name__).error(f"Avvio client Pyrogram fallito: {str(e)}")
+
+    # Salvataggio periodico della directory utenti
+    app.job_queue.run_repeating(
+        flush_user_directory,
+        interval=config.USER_DIRECTORY_FLUSH_INTERVAL,
+        name="flush_user_directory"
+    )
+    # Registrazioni e stati boost di premium_users scritti in blocco
+    app.job_queue.run_repeating(flush_premium_writes, interval=config.PREMIUM_FLUSH_INTERVAL, name="flush_premium_writes")
+    # Salvataggio in blocco degli avvisi
+    app.job_queue.run_repeating(flush_warn_ledger, interval=config.WARN_FLUSH_INTERVAL, name="flush_warn_ledger")
+    # Pulizia completa delle mappe con scadenza (stato antiflood, mute)
+    app.job_queue.run_repeating(sweep_expiring_maps, interval=300, name="sweep_expiring_maps")
+    # Snapshot incrementale dello stato di moderazione
+    app.job_queue.run_repeating(
+        save_state_snapshot,
+        interval=config.STATE_SNAPSHOT_INTERVAL,
+        name="save_state_snapshot"
+    )
+    # Cancellazioni programmate dei messaggi temporanei
+    app.job_queue.run_repeating(process_deletions, interval=config.DELETION_TICK, name="process_deletions")
+    # Update registrati per il replay scritti in blocco
+    if config.RECORD_UPDATES_PATH:
+        app.job_queue.run_repeating(
+            flush_traffic_recording,
+            interval=config.RECORD_FLUSH_INTERVAL,
+            name="flush_traffic_recording"
+        )
+
+async def on_shutdown(app: Application):
+    profiler.stop()
+    await stop_resolver()
+    try:
+        await state_snapshot.save_full()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Errore salvataggio snapshot: {str(e)}")
+    await user_directory.flush()
+    await deletion_scheduler.flush()
+    await warn_ledger.flush()
+    await premium_writes.flush()
+    await metrics_server.stop()
+    if config.RECORD_UPDATES_PATH:
+        traffic_recorder.flush()
+    # Chiude le connessioni del motore DB asincrono
+    await dispose_async_engine()
+
 def main():
     # Configurazione logging
     logging.basicConfig(
@@ -19,13 +107,30 @@ def main():
     logger = logging.getLogger(__name__)
 
     # Crea l'applicazione con la versione corretta della libreria
-    app = Application.builder().token(TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        # Update di gruppi diversi in parallelo, ordine preservato all'interno di ogni chat
+        .concurrent_updates(ChatSequencer(config.MAX_CONCURRENT_UPDATES))
+        # Tutte le chiamate alla Bot API passano dallo scheduler in uscita (limiti, priorità, RetryAfter)
+        .rate_limiter(outbound_scheduler)
+    )
+    if config.WEBHOOK_URL:
+        # Webhook: server HTTP interno e coda di ingresso limitata al posto dell'Updater
+        builder = builder.updater(None).update_queue(asyncio.Queue(maxsize=config.WEBHOOK_QUEUE_SIZE))
+    app = builder.build()
     
     # Registra gli handler
     setup_handlers(app)
     
     logger.info("Bot avviato correttamente")
-    app.run_polling()
+    # ALL_TYPES include gli update chat_member e chat_boost, necessari al roster admin e all'indice dei boost
+    if config.WEBHOOK_URL:
+        asyncio.run(run_webhook(app, on_startup, on_shutdown, allowed_updates=Update.ALL_TYPES))
+    else:
+        app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
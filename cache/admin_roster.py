@@ -0,0 +1,92 @@
+# /cache/admin_roster.py
+import asyncio
+import logging
+import time
+from telegram import Update, ChatMember
+from telegram.ext import ContextTypes
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+
+
+class _Roster:
+    __slots__ = ("admins", "owner_id", "loaded_at")
+
+    def __init__(self, admins: set, owner_id, loaded_at: float):
+        self.admins = admins
+        self.owner_id = owner_id
+        self.loaded_at = loaded_at
+
+
+class AdminRoster:
+    """
+    Elenco admin per gruppo, caricato una volta con get_chat_administrators,
+    aggiornato dagli update ChatMember e ricaricato dopo `ttl` secondi.
+    """
+
+    def __init__(self, ttl: float, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._rosters = {}  # chat_id -> _Roster
+        self._locks = {}    # chat_id -> asyncio.Lock (evita caricamenti doppi in parallelo)
+
+    async def _get(self, bot, chat_id: int) -> _Roster:
+        roster = self._rosters.get(chat_id)
+        if roster and self._clock() - roster.loaded_at < self.ttl:
+            return roster
+
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            roster = self._rosters.get(chat_id)
+            if roster and self._clock() - roster.loaded_at < self.ttl:
+                return roster
+
+            admins = await bot.get_chat_administrators(chat_id)
+            owner_id = next((m.user.id for m in admins if m.status == ChatMember.OWNER), None)
+            roster = _Roster({m.user.id for m in admins}, owner_id, self._clock())
+            self._rosters[chat_id] = roster
+            logger.debug(f"Admin caricati per {chat_id}: {len(roster.admins)}")
+            return roster
+
+    async def is_admin(self, bot, chat_id: int, user_id: int) -> bool:
+        return user_id in (await self._get(bot, chat_id)).admins
+
+    async def is_owner(self, bot, chat_id: int, user_id: int) -> bool:
+        return (await self._get(bot, chat_id)).owner_id == user_id
+
+    def apply_member_update(self, chat_id: int, user_id: int, status: str):
+        """Aggiorna il roster locale senza chiamate API (promozioni/retrocessioni)"""
+        roster = self._rosters.get(chat_id)
+        if roster is None:
+            return  # verrà caricato completo al primo utilizzo
+
+        if status in ADMIN_STATUSES:
+            roster.admins.add(user_id)
+        else:
+            roster.admins.discard(user_id)
+
+        if status == ChatMember.OWNER:
+            roster.owner_id = user_id
+        elif roster.owner_id == user_id:
+            roster.owner_id = None
+
+    def invalidate(self, chat_id: int):
+        self._rosters.pop(chat_id, None)
+
+
+admin_roster = AdminRoster(ttl=config.ADMIN_ROSTER_TTL)
+
+async def track_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler ChatMember: mantiene aggiornato il roster admin"""
+    member_update = update.chat_member or update.my_chat_member
+    if not member_update:
+        return
+
+    new_member = member_update.new_chat_member
+    admin_roster.apply_member_update(member_update.chat.id, new_member.user.id, new_member.status)
+    logger.info(f"Aggiornato stato {new_member.user.id} in {member_update.chat.id}: {new_member.status}")
@@ -0,0 +1,156 @@
+# /cache/expiring.py
+import heapq
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Tutte le mappe con nome, per il job di pulizia e le statistiche
+_registry = {}
+
+
+class ExpiringEntry:
+    """
+    Voce della mappa e dello heap insieme (niente tuple o contatori per voce).
+    I valori che estendono questa classe e definiscono `value` vengono salvati direttamente
+    come voce, senza oggetto contenitore (vedi antiflood.record.FloodRecord).
+    """
+    __slots__ = ("key", "deadline", "queued")
+
+    def __lt__(self, other):
+        return self.queued < other.queued
+
+
+class _Entry(ExpiringEntry):
+    __slots__ = ("value",)
+
+    def __init__(self, key, deadline: float, value):
+        self.key = key
+        self.deadline = deadline
+        self.queued = deadline  # scadenza con cui la voce è nello heap
+        self.value = value
+
+
+class ExpiringDict:
+    """
+    Dizionario con scadenza per chiave: ogni voce sparisce `ttl` secondi dopo l'ultima scrittura (o touch).
+    Le scadenze stanno in un min-heap con una sola voce per chiave viva; la pulizia è incrementale
+    a ogni scrittura (al massimo `sweep_batch` voci) e completa con sweep().
+    """
+
+    def __init__(self, ttl: float, name: str = None, clock=time.monotonic, sweep_batch: int = 64):
+        self.ttl = ttl
+        self.name = name
+        self._clock = clock
+        self._sweep_batch = sweep_batch
+        self._data = {}   # key -> _Entry
+        self._heap = []   # _Entry ordinate per `queued`
+        self.evictions = 0
+        if name:
+            _registry[name] = self
+
+    def set(self, key, value, ttl: float = None):
+        now = self._clock()
+        deadline = now + (self.ttl if ttl is None else ttl)
+        entry = self._data.get(key)
+        if entry is not None and (entry is value or type(entry) is _Entry and not isinstance(value, ExpiringEntry)):
+            # La voce nello heap resta valida: se scade dopo viene rimessa in coda allo sweep
+            entry.deadline = deadline
+            if entry is not value:
+                entry.value = value
+        else:
+            if isinstance(value, ExpiringEntry):
+                entry = value
+                entry.key = key
+                entry.deadline = entry.queued = deadline
+            else:
+                entry = _Entry(key, deadline, value)
+            # Un'eventuale voce precedente resta nello heap e viene scartata allo sweep
+            self._data[key] = entry
+            heapq.heappush(self._heap, entry)
+        self._sweep(now, self._sweep_batch)
+
+    __setitem__ = set
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None or entry.deadline <= self._clock():
+            return default
+        return entry.value
+
+    def touch_get(self, key, ttl: float = None):
+        """Come get(), ma rinnova la scadenza della voce trovata (un solo lookup)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        now = self._clock()
+        if entry.deadline <= now:
+            return None
+        entry.deadline = now + (self.ttl if ttl is None else ttl)
+        return entry.value
+
+    def __getitem__(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry.deadline <= self._clock():
+            raise KeyError(key)
+        return entry.value
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry.deadline > self._clock()
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        if entry is None or entry.deadline <= self._clock():
+            return default
+        return entry.value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def items(self):
+        now = self._clock()
+        return [(key, entry.value) for key, entry in self._data.items() if entry.deadline > now]
+
+    def sweep(self) -> int:
+        """Rimuove tutte le voci scadute e restituisce quante ne ha eliminate"""
+        return self._sweep(self._clock(), None)
+
+    def _sweep(self, now: float, limit) -> int:
+        heap = self._heap
+        removed = 0
+        while heap and heap[0].queued <= now and (limit is None or removed < limit):
+            entry = heapq.heappop(heap)
+            if self._data.get(entry.key) is not entry:
+                continue  # voce già rimossa o sostituita
+            if entry.deadline > now:
+                # Rinnovata dopo l'inserimento nello heap: torna in coda con la nuova scadenza
+                entry.queued = entry.deadline
+                heapq.heappush(heap, entry)
+                continue
+            del self._data[entry.key]
+            removed += 1
+
+        self.evictions += removed
+        # Compatta lo heap se le voci di chiavi rimosse a mano sono troppe
+        if len(heap) > 2 * len(self._data) + 1024:
+            self._heap = [entry for entry in heap if self._data.get(entry.key) is entry]
+            heapq.heapify(self._heap)
+        return removed
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "evictions": self.evictions, "heap": len(self._heap)}
+
+
+def expiring_maps() -> dict:
+    return dict(_registry)
+
+async def sweep_expiring_maps(context=None):
+    """Job periodico: pulizia completa di tutte le mappe registrate e log delle dimensioni"""
+    for name, mapping in _registry.items():
+        mapping.sweep()
+        stats = mapping.stats()
+        logger.info(f"Mappa {name}: {stats['size']} voci, {stats['evictions']} scadute in totale")
@@ -0,0 +1,228 @@
+# /cache/user_directory.py
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from sqlalchemy import select
+from telegram import Update, User
+from telegram.ext import ContextTypes
+from cache.ttl_lru import TTLCache, MISSING
+from database.db_manager import get_async_db_session, dialect_insert, KnownUser
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Righe per INSERT multiplo: 5 parametri per riga, ben sotto i limiti di SQLite (32766) e Postgres (65535)
+FLUSH_CHUNK = 1000
+
+
+class DirectoryEntry:
+    __slots__ = ("user_id", "username", "first_name", "last_name")
+
+    def __init__(self, user_id: int, username, first_name: str, last_name):
+        self.user_id = user_id
+        self.username = username.lower() if username else None
+        self.first_name = first_name or ""
+        self.last_name = last_name
+
+    def same_as(self, other) -> bool:
+        return (
+            self.username == other.username
+            and self.first_name == other.first_name
+            and self.last_name == other.last_name
+        )
+
+    def to_user(self) -> User:
+        """Oggetto telegram.User equivalente (id, nomi, username) per gli handler"""
+        return User(
+            id=self.user_id,
+            first_name=self.first_name,
+            is_bot=False,
+            last_name=self.last_name,
+            username=self.username
+        )
+
+
+class UserDirectory:
+    """
+    Directory ID/username/nome alimentata passivamente dagli update.
+    LRU con TTL in memoria, persistita su known_users con scritture raggruppate (flush).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, recent_per_chat: int = 300):
+        self._by_id = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._by_username = TTLCache(maxsize=maxsize, ttl=ttl)  # username minuscolo -> user_id
+        self._dirty = {}  # user_id -> DirectoryEntry da salvare
+        self._recent_per_chat = recent_per_chat
+        self._recent = {}  # chat_id -> deque di (message_id, user_id) degli ultimi messaggi
+
+    def observe(self, user):
+        """Registra un utente visto in un update (nessuna I/O)"""
+        if not user or getattr(user, "is_bot", False):
+            return
+
+        entry = DirectoryEntry(user.id, user.username, user.first_name, user.last_name)
+        cached = self._by_id.get(user.id)
+        if cached is MISSING or not cached.same_as(entry):
+            self._dirty[user.id] = entry
+            if cached is not MISSING and cached.username and cached.username != entry.username:
+                self._by_username.pop(cached.username)
+        self._remember(entry)
+
+    def observe_author(self, chat_id: int, message_id: int, user_id: int):
+        """Ricorda l'autore di un messaggio di gruppo (anello degli ultimi messaggi per chat)"""
+        recent = self._recent.get(chat_id)
+        if recent is None:
+            recent = self._recent[chat_id] = deque(maxlen=self._recent_per_chat)
+        recent.append((message_id, user_id))
+
+    def authors_since(self, chat_id: int, first_message_id: int, last_message_id: int) -> list:
+        """Autori distinti (in ordine di apparizione) dei messaggi nell'intervallo, tra quelli ricordati"""
+        authors = {}
+        for message_id, user_id in self._recent.get(chat_id, ()):
+            if first_message_id <= message_id < last_message_id:
+                authors.setdefault(user_id, None)
+        return list(authors)
+
+    def _remember(self, entry: DirectoryEntry):
+        self._by_id.set(entry.user_id, entry)
+        if entry.username:
+            self._by_username.set(entry.username, entry.user_id)
+
+    async def lookup(self, user_id: int):
+        """DirectoryEntry dalla cache o da known_users; None se sconosciuto"""
+        entry = self._by_id.get(user_id)
+        if entry is not MISSING:
+            return entry
+
+        async with get_async_db_session() as session:
+            row = await session.get(KnownUser, user_id)
+        if row is None:
+            return None
+
+        entry = DirectoryEntry(row.user_id, row.username, row.first_name, row.last_name)
+        self._remember(entry)
+        return entry
+
+    async def lookup_many(self, user_ids) -> dict:
+        """user_id -> DirectoryEntry per gli utenti noti: cache, poi una sola query per i mancanti"""
+        found = {}
+        missing = []
+        for user_id in user_ids:
+            entry = self._by_id.get(user_id)
+            if entry is MISSING:
+                missing.append(user_id)
+            else:
+                found[user_id] = entry
+        if not missing:
+            return found
+
+        async with get_async_db_session() as session:
+            for start in range(0, len(missing), FLUSH_CHUNK):
+                result = await session.execute(
+                    select(KnownUser).where(KnownUser.user_id.in_(missing[start:start + FLUSH_CHUNK]))
+                )
+                for row in result.scalars():
+                    entry = DirectoryEntry(row.user_id, row.username, row.first_name, row.last_name)
+                    self._remember(entry)
+                    found[row.user_id] = entry
+        return found
+
+    async def lookup_username(self, username: str):
+        """DirectoryEntry per username (senza '@'), dalla cache o da known_users"""
+        username = username.lower()
+        user_id = self._by_username.get(username)
+        if user_id is not MISSING:
+            entry = self._by_id.get(user_id)
+            if entry is not MISSING and entry.username == username:
+                return entry
+
+        async with get_async_db_session() as session:
+            result = await session.execute(
+                select(KnownUser)
+                .where(KnownUser.username == username)
+                .order_by(KnownUser.updated_at.desc())
+                .limit(1)
+            )
+            row = result.scalars().first()
+        if row is None:
+            return None
+
+        entry = DirectoryEntry(row.user_id, row.username, row.first_name, row.last_name)
+        self._remember(entry)
+        return entry
+
+    async def flush(self):
+        """Salva in blocco gli utenti nuovi o modificati, FLUSH_CHUNK righe per statement"""
+        if not self._dirty:
+            return
+
+        pending, self._dirty = self._dirty, {}
+        now = datetime.now(timezone.utc)
+        entries = list(pending.values())
+        saved = 0
+        for start in range(0, len(entries), FLUSH_CHUNK):
+            chunk = entries[start:start + FLUSH_CHUNK]
+            try:
+                async with get_async_db_session() as session:
+                    await session.execute(_upsert(chunk, now))
+                saved += len(chunk)
+            except Exception as e:
+                # Rimette in coda solo il blocco non salvato (senza sovrascrivere dati più recenti)
+                for entry in chunk:
+                    self._dirty.setdefault(entry.user_id, entry)
+                logger.error(f"Errore salvataggio directory utenti ({len(chunk)} utenti): {str(e)}")
+        logger.debug(f"Directory utenti: salvati {saved} utenti")
+
+
+def _upsert(entries: list, now: datetime):
+    stmt = dialect_insert(KnownUser).values([
+        {
+            "user_id": e.user_id,
+            "username": e.username,
+            "first_name": e.first_name,
+            "last_name": e.last_name,
+            "updated_at": now,
+        }
+        for e in entries
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=[KnownUser.user_id],
+        set_={
+            "username": stmt.excluded.username,
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+            "updated_at": stmt.excluded.updated_at,
+        }
+    )
+
+
+user_directory = UserDirectory(
+    maxsize=config.USER_DIRECTORY_SIZE,
+    ttl=config.USER_DIRECTORY_TTL,
+    recent_per_chat=config.RECENT_AUTHORS_PER_CHAT
+)
+
+async def observe_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler passivo: registra tutti gli utenti che compaiono in un update"""
+    user_directory.observe(update.effective_user)
+
+    message = update.effective_message
+    if message:
+        if message.from_user and message.chat.type in ("group", "supergroup"):
+            user_directory.observe_author(message.chat_id, message.message_id, message.from_user.id)
+        if message.reply_to_message:
+            user_directory.observe(message.reply_to_message.from_user)
+        for member in message.new_chat_members or ():
+            user_directory.observe(member)
+        user_directory.observe(message.left_chat_member)
+
+    member_update = update.chat_member
+    if member_update:
+        user_directory.observe(member_update.new_chat_member.user)
+
+async def flush_user_directory(context: ContextTypes.DEFAULT_TYPE):
+    """Job periodico di salvataggio della directory"""
+    await user_directory.flush()
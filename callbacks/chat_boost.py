@@ -0,0 +1,51 @@
+# /callbacks/chat_boost.py
+import logging
+from telegram import Update, ChatPermissions
+from telegram.constants import ChatBoostSources
+from telegram.ext import ContextTypes
+from database.boost_index import boost_index
+from callbacks.premium_block import premium_muted
+from outbound import submit
+
+logger = logging.getLogger(__name__)
+
+async def track_chat_boost(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Update chat_boost / removed_chat_boost: tiene aggiornato l'indice dei boost e smuta chi boosta"""
+    if update.removed_chat_boost:
+        removed = update.removed_chat_boost
+        user_id = await boost_index.remove(removed.chat.id, removed.boost_id)
+        logger.info(f"Boost rimosso in {removed.chat.id} (utente {user_id})")
+        return
+
+    boosted = update.chat_boost
+    if not boosted:
+        return
+
+    chat = boosted.chat
+    boost = boosted.boost
+    user = getattr(boost.source, "user", None)
+    # Solo i boost premium di un utente noto contano per lo sblocco (come nella verifica manuale)
+    if user is None or boost.source.source != ChatBoostSources.PREMIUM:
+        return
+
+    await boost_index.add(chat.id, user.id, boost.boost_id, boost.expiration_date)
+    logger.info(f"Boost ricevuto in {chat.id} da {user.id}")
+
+    # Utente mutato dal controllo premium: sblocco immediato senza attendere il pulsante
+    if premium_muted.pop((chat.id, user.id)) is None:
+        return
+    try:
+        await context.bot.restrict_chat_member(
+            chat_id=chat.id,
+            user_id=user.id,
+            permissions=ChatPermissions.all_permissions()
+        )
+        # Ringraziamento in background: non tiene fermi gli update della chat
+        submit(context.bot.send_message(
+            chat_id=chat.id,
+            text=f"🎉 Grazie {user.mention_html()} per aver potenziato il gruppo! 🚀",
+            parse_mode="HTML"
+        ), "boost_thanks")
+        logger.info(f"Utente {user.id} smutato automaticamente dopo il boost")
+    except Exception as e:
+        logger.error(f"Errore smute automatico {user.id}: {str(e)}")
@@ -1,14 +1,33 @@
 # /callbacks/hasBoosted.py
-from telegram import Update, ChatMemberOwner, ChatMemberAdministrator, ChatPermissions
+from telegram import Update, ChatPermissions
 from telegram.ext import ContextTypes, CallbackQueryHandler
-from telegram.error import BadRequest, RetryAfter
-from database.db_manager import get_db_session, PremiumUser
+from telegram.constants import ChatBoostSources
+from telegram.error import BadRequest
+from database.premium_cache import get_premium_state
+from database.boost_index import boost_index
+from cache.admin_roster import admin_roster
+from cache.expiring import ExpiringDict
+from callbacks.premium_block import premium_muted
+from outbound import submit
 from datetime import datetime, timedelta, timezone
 import logging
-import asyncio
 
 logger = logging.getLogger(__name__)
 
+# (chat_id, user_id) già verificati via get_user_chat_boosts negli ultimi 5 minuti
+api_checked = ExpiringDict(ttl=300, name="boost_api_checked")
+
+async def _import_boosts(bot, chat_id: int, user_id: int) -> bool:
+    """Importa nell'indice i boost premium attivi letti dall'API; True se ce n'è almeno uno"""
+    boosts = await bot.get_user_chat_boosts(chat_id, user_id)
+    now = datetime.now(timezone.utc)
+    found = False
+    for boost in boosts.boosts:
+        if boost.source.source == ChatBoostSources.PREMIUM and boost.expiration_date > now:
+            await boost_index.add(chat_id, user_id, boost.boost_id, boost.expiration_date)
+            found = True
+    return found
+
 async def handle_unmute_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     try:
@@ -28,71 +47,53 @@ async def handle_unmute_callback(update: Update, context: ContextTypes.DEFAULT_T
             await query.answer("⚠️ Non sei autorizzato a sbloccare questo utente!", show_alert=True)
             return
 
-        with get_db_session() as session:
-            db_user = session.query(PremiumUser).filter(PremiumUser.user_id == target_user_id).first()
+        # Utente registrato? (cache dello stato premium, query solo al primo accesso)
+        if await get_premium_state(target_user_id) is None:
+            await query.answer("⚠️ Utente non registrato", show_alert=True)
+            return
 
-            if not db_user:
-                await query.answer("⚠️ Utente non registrato", show_alert=True)
+        try:
+            # 1. Controllo gerarchia
+            if await admin_roster.is_admin(context.bot, chat.id, user.id):
+                await query.answer("🔑 Sei admin/proprietario!", show_alert=True)
                 return
 
-            try:
-                # 1. Controllo gerarchia
-                chat_member = await context.bot.get_chat_member(chat.id, user.id)
-                if isinstance(chat_member, (ChatMemberOwner, ChatMemberAdministrator)):
-                    await query.answer("🔑 Sei admin/proprietario!", show_alert=True)
-                    return
-
-                # 2. Verifica boost utente nella chat specifica
-                try:
-                    boosts = await context.bot.get_user_chat_boosts(chat.id, user.id)
-                    has_active_boost = any(
-                        boost.source.source == "premium" and 
-                        (datetime.now(timezone.utc) - boost.add_date).days < 365
-                        for boost in boosts.boosts
-                    )
-                except RetryAfter as e:
-                    await asyncio.sleep(e.retry_after)
-                    boosts = await context.bot.get_user_chat_boosts(chat.id, user.id)
-                    has_active_boost = any(
-                        boost.source.source == "premium" and 
-                        (datetime.now(timezone.utc) - boost.add_date).days < 365
-                        for boost in boosts.boosts
-                    )
-
-                if not has_active_boost:
-                    await query.answer(
-                        "🚫 Boost non attivo! Verifica di aver:"
-                        "\n1. Boostato il gruppo corretto"
-                        "\n2. Atteso 5 minuti",
-                        show_alert=True
-                    )
-                    return
-
-                # 3. Aggiornamento database e unmute
-                db_user.has_boosted = True
-                db_user.boost_verified_at = datetime.now(timezone.utc)
-                session.commit()
-
-                await context.bot.restrict_chat_member(
-                    chat_id=chat.id,
-                    user_id=user.id,
-                    permissions=ChatPermissions.all_permissions()
-                )
-                
-                await query.answer("✅ Sbloccato con successo!", show_alert=True)
-                await query.message.edit_reply_markup(reply_markup=None)
-
-                # Messaggio di ringraziamento
-                await context.bot.send_message(
-                    chat_id=chat.id,
-                    text=f"🎉 Grazie {user.mention_html()} per aver potenziato il gruppo! 🚀",
-                    parse_mode="HTML"
+            # 2. Boost dall'indice locale alimentato dagli update chat_boost: nessuna chiamata API
+            has_active_boost = boost_index.is_boosting(chat.id, user.id)
+            if not has_active_boost and (chat.id, user.id) not in api_checked:
+                # Boost fatti prima che il bot li ricevesse: al massimo una verifica API ogni 5 minuti
+                api_checked.set((chat.id, user.id), True)
+                has_active_boost = await _import_boosts(context.bot, chat.id, user.id)
+
+            if not has_active_boost:
+                await query.answer(
+                    "🚫 Boost non attivo! Verifica di aver:"
+                    "\n1. Boostato il gruppo corretto"
+                    "\n2. Atteso 5 minuti",
+                    show_alert=True
                 )
+                return
 
-            except BadRequest as e:
-                logger.error(f"Errore API: {str(e)}")
-                await query.answer("⚠️ Errore durante la verifica", show_alert=True)
-                session.rollback()
+            # 3. Unmute (il database è già aggiornato dall'indice dei boost)
+            premium_muted.pop((chat.id, user.id))
+            await context.bot.restrict_chat_member(
+                chat_id=chat.id,
+                user_id=user.id,
+                permissions=ChatPermissions.all_permissions()
+            )
+            
+            await query.answer("✅ Sbloccato con successo!", show_alert=True)
+            # Pulsante e ringraziamento in background: non tengono fermi gli update della chat
+            submit(query.message.edit_reply_markup(reply_markup=None), "boost_keyboard")
+            submit(context.bot.send_message(
+                chat_id=chat.id,
+                text=f"🎉 Grazie {user.mention_html()} per aver potenziato il gruppo! 🚀",
+                parse_mode="HTML"
+            ), "boost_thanks")
+
+        except BadRequest as e:
+            logger.error(f"Errore API: {str(e)}")
+            await query.answer("⚠️ Errore durante la verifica", show_alert=True)
 
     except Exception as e:
         logger.error(f"Errore generale: {str(e)}", exc_info=True)
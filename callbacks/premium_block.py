@@ -1,8 +1,11 @@
 import logging
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, ChatPermissions, ChatMember
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton, ChatPermissions, ChatMember
 from telegram.ext import ContextTypes
 from telegram.error import BadRequest
-from database.db_manager import get_db_session, PremiumUser, is_premium_check_enabled
+from database.premium_cache import get_premium_state, register_premium_user
+from database.boost_index import boost_index
+from cache.expiring import ExpiringDict
+from outbound import submit
 from datetime import datetime, timedelta, timezone
 import sys
 import os
@@ -31,92 +34,92 @@ KEYBOARD = InlineKeyboardMarkup([
 
 MUTE_DURATION = timedelta(minutes=5)
 
-async def check_premium_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message:
+# (chat_id, user_id) mutati da questo controllo: smutati in automatico quando arriva il loro boost
+premium_muted = ExpiringDict(ttl=MUTE_DURATION.total_seconds(), name="premium_muted")
+
+async def premium_rule(message_ctx, context: ContextTypes.DEFAULT_TYPE):
+    """Regola premium della pipeline messaggi (vedi pipeline.MessageContext); True se l'utente è stato mutato"""
+    user = message_ctx.user
+    chat = message_ctx.chat
+
+    if not user.is_premium:
         return
 
-    user = update.effective_user
-    chat = update.effective_chat
+    # Verifica se il controllo premium è attivo (snapshot in memoria, nessuna query)
+    if not message_ctx.settings.premium_check:
+        logger.debug("Controllo premium disattivato, salto il mute.")
+        return
 
-    if not user or not user.is_premium:
+    # Boost a questo gruppo già noto dagli update chat_boost: nessuna query e nessuna chiamata API
+    if boost_index.is_boosting(chat.id, user.id):
         return
 
-    with get_db_session() as session:
-        # Verifica se il controllo premium è attivo
-        if not is_premium_check_enabled(session):
-            logger.info("Controllo premium disattivato, salto il mute.")
+    try:
+        # Utenti già boostati: nessuna chiamata API
+        state = await get_premium_state(user.id)
+        if state:
             return
 
+        # Controlla se l'utente è admin/owner
         try:
-            # Controlla se l'utente è admin/owner
-            try:
-                chat_member = await context.bot.get_chat_member(chat.id, user.id)
-                if chat_member.status in ['creator', 'administrator']:
-                    logger.info(f"Salto mute per admin/owner: {user.id}")
-                    return
-            except BadRequest as e:
-                logger.error(f"Errore controllo stato utente: {str(e)}")
+            if await message_ctx.is_admin(context.bot):
+                logger.info(f"Salto mute per admin/owner: {user.id}")
                 return
+        except BadRequest as e:
+            logger.error(f"Errore controllo stato utente: {str(e)}")
+            return
 
-            db_user = session.query(PremiumUser).filter(PremiumUser.user_id == user.id).first()
-
-            # Registra nuovo utente se necessario
-            if not db_user:
-                db_user = PremiumUser(user_id=user.id, has_boosted=False)
-                session.add(db_user)
-                session.commit()
-                logger.info(f"Nuovo utente premium registrato: {user.id}")
+        # Registra nuovo utente se necessario
+        if state is None:
+            register_premium_user(user.id)
+            logger.info(f"Nuovo utente premium registrato: {user.id}")
 
-            if db_user.has_boosted:
-                return
+        # Calcola la data di scadenza del mute
+        until_date = int((datetime.now(timezone.utc) + MUTE_DURATION).timestamp())
 
-            # Calcola la data di scadenza del mute
-            until_date = int((datetime.now(timezone.utc) + MUTE_DURATION).timestamp())
-
-            # Applica restrizioni complete
-            try:
-                await context.bot.restrict_chat_member(
-                    chat_id=chat.id,
-                    user_id=user.id,
-                    permissions=ChatPermissions(
-                        can_send_messages=False,
-                        can_send_audios=False,
-                        can_send_documents=False,
-                        can_send_photos=False,
-                        can_send_videos=False,
-                        can_send_video_notes=False,
-                        can_send_voice_notes=False,
-                        can_send_polls=False,
-                        can_send_other_messages=False,
-                        can_add_web_page_previews=False,
-                        can_change_info=False,
-                        can_invite_users=False,
-                        can_pin_messages=False,
-                        can_manage_topics=False
-                    ),
-                    until_date=until_date
-                )
-                
-                # Aggiorna il pulsante con il user_id
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🚀 Potenzia il gruppo", url=Link)],
-                    [InlineKeyboardButton("✅ L'ho già fatto", callback_data=f"unmute_me_v2:{user.id}")]
-                ])
-                
-                await update.message.reply_text(MESSAGE, reply_markup=keyboard, parse_mode="HTML")
-                logger.info(f"Utente {user.id} mutato correttamente fino a {until_date}")
-
-            except BadRequest as e:
-                if "Can't remove chat owner" in str(e):
-                    logger.warning(f"Tentativo di mutare il proprietario: {user.id}")
-                else:
-                    logger.error(f"Errore API durante il mute: {str(e)}")
-                    raise
-
-        except Exception as e:
-            logger.error(f"Errore generale durante il mute: {str(e)}", exc_info=True)
-            session.rollback()
-            try:
-                await update.message.reply_text("❌ Si è verificato un errore durante l'operazione")
-            except Exception as e:
-                logger.error(f"Errore invio messaggio: {str(e)}")
+        # Applica restrizioni complete
+        try:
+            await context.bot.restrict_chat_member(
+                chat_id=chat.id,
+                user_id=user.id,
+                permissions=ChatPermissions(
+                    can_send_messages=False,
+                    can_send_audios=False,
+                    can_send_documents=False,
+                    can_send_photos=False,
+                    can_send_videos=False,
+                    can_send_video_notes=False,
+                    can_send_voice_notes=False,
+                    can_send_polls=False,
+                    can_send_other_messages=False,
+                    can_add_web_page_previews=False,
+                    can_change_info=False,
+                    can_invite_users=False,
+                    can_pin_messages=False,
+                    can_manage_topics=False
+                ),
+                until_date=until_date
+            )
+            premium_muted.set((chat.id, user.id), True)
+            
+            # Aggiorna il pulsante con il user_id
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("🚀 Potenzia il gruppo", url=Link)],
+                [InlineKeyboardButton("✅ L'ho già fatto", callback_data=f"unmute_me_v2:{user.id}")]
+            ])
+            
+            # Avviso in background: passa dal limite di invio della chat, il mute è già applicato
+            submit(message_ctx.message.reply_text(MESSAGE, reply_markup=keyboard, parse_mode="HTML"), "premium_notice")
+            logger.info(f"Utente {user.id} mutato correttamente fino a {until_date}")
+            return True
+
+        except BadRequest as e:
+            if "Can't remove chat owner" in str(e):
+                logger.warning(f"Tentativo di mutare il proprietario: {user.id}")
+            else:
+                logger.error(f"Errore API durante il mute: {str(e)}")
+                raise
+
+    except Exception as e:
+        logger.error(f"Errore generale durante il mute: {str(e)}", exc_info=True)
+        submit(message_ctx.message.reply_text("❌ Si è verificato un errore durante l'operazione"), "premium_error")
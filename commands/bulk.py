@@ -0,0 +1,191 @@
+# /commands/bulk.py
+"""
+Comandi di moderazione su più utenti: /rban_multi, /rwarn_multi, /blocca_multi, /libera_multi.
+
+Bersagli: una lista di ID/username negli argomenti, oppure (in risposta a un messaggio)
+tutti gli autori dei messaggi dal messaggio citato fino al comando.
+Gli utenti vengono risolti in parallelo e le azioni eseguite con al massimo BULK_CONCURRENCY
+chiamate contemporanee; l'esito per utente arriva in un unico messaggio di riepilogo.
+"""
+import asyncio
+import logging
+import re
+from datetime import datetime, timezone
+from telegram import Update, ChatPermissions, User
+from telegram.ext import ContextTypes
+from utils import resolve_user_token, send_private_or_group_message, recently_muted, verified_boosters
+from cache.admin_roster import admin_roster
+from cache.user_directory import user_directory
+from commands.mute_unmute import parse_duration, format_duration, DEFAULT_MUTE_DURATION
+from database.settings_store import settings_store
+from database.warn_ledger import warn_ledger
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+USAGE = (
+    "Uso: /{command} [ID/@username ...]{extra}\n"
+    "oppure in risposta a un messaggio: agisce su tutti gli autori da quel messaggio in poi."
+)
+
+
+async def _reject(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    msg = update.message
+    result = await send_private_or_group_message(
+        issuer_id=msg.from_user.id,
+        chat_id=msg.chat.id,
+        bot=context.bot,
+        text=text
+    )
+    if result == "group":
+        try:
+            await msg.delete()
+        except:
+            pass
+
+
+async def _collect_targets(update: Update, context: ContextTypes.DEFAULT_TYPE, tokens: list):
+    """Risolve tutti i bersagli in parallelo: restituisce (utenti, token non risolti)"""
+    msg = update.message
+
+    if tokens:
+        tokens = list(dict.fromkeys(tokens))[:config.BULK_MAX_TARGETS]
+        results = await asyncio.gather(
+            *(resolve_user_token(context.bot, token) for token in tokens),
+            return_exceptions=True
+        )
+        users, missing = {}, []
+        for token, result in zip(tokens, results):
+            if isinstance(result, Exception) or result is None:
+                missing.append(token)
+            else:
+                # Token diversi per lo stesso utente (ID e @username): una sola azione
+                users.setdefault(result.id, result)
+        return list(users.values()), missing
+
+    if msg.reply_to_message:
+        user_ids = user_directory.authors_since(msg.chat.id, msg.reply_to_message.message_id, msg.message_id)
+        # L'autore del messaggio citato c'è sempre, anche se è più vecchio dell'anello
+        replied_author = msg.reply_to_message.from_user
+        if replied_author and replied_author.id not in user_ids:
+            user_ids.insert(0, replied_author.id)
+        user_ids = [uid for uid in user_ids if uid not in (msg.from_user.id, context.bot.id)]
+        user_ids = user_ids[:config.BULK_MAX_TARGETS]
+        entries = await asyncio.gather(*(user_directory.lookup(uid) for uid in user_ids))
+        users = [
+            entry.to_user() if entry else User(id=uid, first_name=str(uid), is_bot=False)
+            for uid, entry in zip(user_ids, entries)
+        ]
+        return users, []
+
+    return [], []
+
+
+async def _run_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str, action, tokens: list, extra_usage: str = ""):
+    msg = update.message
+    chat = msg.chat
+
+    if not await admin_roster.is_admin(context.bot, chat.id, msg.from_user.id):
+        await _reject(update, context, f"❌ Solo admin possono usare /{command}.")
+        return
+
+    users, missing = await _collect_targets(update, context, tokens)
+    if not users and not missing:
+        await _reject(update, context, USAGE.format(command=command, extra=extra_usage))
+        return
+
+    semaphore = asyncio.Semaphore(max(config.BULK_CONCURRENCY, 1))
+
+    async def apply(user):
+        async with semaphore:
+            try:
+                if await admin_roster.is_admin(context.bot, chat.id, user.id):
+                    return "❌ admin"
+                return await action(user)
+            except Exception as e:
+                logger.error(f"Errore /{command} su {user.id}: {e}")
+                return "❌ errore"
+
+    outcomes = await asyncio.gather(*(apply(user) for user in users))
+
+    lines = [f"• {user.full_name} ({user.id}): {outcome}" for user, outcome in zip(users, outcomes)]
+    lines += [f"• {token}: ❌ non trovato" for token in missing]
+    await msg.reply_text(f"📋 /{command}: {len(users)} utenti\n" + "\n".join(lines))
+    logger.info(f"/{command} in {chat.id}: {len(users)} utenti, {len(missing)} non trovati")
+
+
+# ——— /rban_multi ——————————————————————————————
+async def bulk_ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.message.chat.id
+
+    async def ban(user):
+        await context.bot.ban_chat_member(chat_id, user.id)
+        await warn_ledger.clear(chat_id, user.id)
+        return "🚫 bannato"
+
+    await _run_bulk(update, context, "rban_multi", ban, context.args or [])
+
+# ——— /rwarn_multi ——————————————————————————————
+async def bulk_warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.message.chat.id
+    max_warns = settings_store.get(chat_id).max_warns
+
+    async def warn(user):
+        warns = await warn_ledger.add(chat_id, user.id)
+        if warns < max_warns:
+            return f"⚠️ avviso {warns}/{max_warns}"
+        await context.bot.ban_chat_member(chat_id, user.id)
+        await warn_ledger.clear(chat_id, user.id)
+        return f"🚫 bannato ({max_warns}/{max_warns} avvisi)"
+
+    await _run_bulk(update, context, "rwarn_multi", warn, context.args or [])
+
+# ——— /blocca_multi ——————————————————————————————
+async def bulk_mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.message.chat.id
+    args = context.args or []
+
+    # Durata opzionale ovunque negli argomenti (es. 10m, 1h30m), come /blocca
+    durations = [arg for arg in args if re.fullmatch(r'(\d+[hms])+', arg)]
+    tokens = [arg for arg in args if arg not in durations]
+    duration = DEFAULT_MUTE_DURATION
+    if durations:
+        try:
+            duration = parse_duration(" ".join(durations))
+        except ValueError as e:
+            await _reject(update, context, f"❌ {e}\nEsempi validi: 5m, 1h30m, 30s, 1h 10m 20s.")
+            return
+
+    async def mute(user):
+        until = datetime.now(timezone.utc) + duration
+        await context.bot.restrict_chat_member(
+            chat_id, user.id,
+            permissions=ChatPermissions(can_send_messages=False),
+            until_date=until
+        )
+        recently_muted.set(user.id, datetime.now(timezone.utc), ttl=duration.total_seconds())
+        return f"🔇 mutato per {format_duration(duration)}"
+
+    await _run_bulk(update, context, "blocca_multi", mute, tokens, extra_usage=" [durata]")
+
+# ——— /libera_multi ——————————————————————————————
+async def bulk_unmute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.message.chat.id
+
+    async def unmute(user):
+        await context.bot.restrict_chat_member(
+            chat_id, user.id,
+            permissions=ChatPermissions(
+                can_send_messages=True,
+                can_send_polls=True,
+                can_send_other_messages=True,
+                can_add_web_page_previews=True
+            )
+        )
+        verified_boosters.add(user.id)
+        return "✅ smutato"
+
+    await _run_bulk(update, context, "libera_multi", unmute, context.args or [])
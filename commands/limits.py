@@ -0,0 +1,73 @@
+# /commands/limits.py
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes
+from database.settings_store import settings_store
+from utils import send_private_or_group_message
+from cache.admin_roster import admin_roster
+
+logger = logging.getLogger(__name__)
+
+# nome usato nel comando -> (campo di ChatSettings, valore minimo)
+LIMITS = {
+    "cooldown": ("media_cooldown", 0),
+    "nuovi": ("new_user_window", 0),
+    "avvisi": ("max_warns", 1),
+}
+
+USAGE = (
+    "Uso: /limiti [cooldown|nuovi|avvisi] [valore]\n"
+    "• cooldown: secondi tra due media\n"
+    "• nuovi: secondi di blocco media per i nuovi utenti\n"
+    "• avvisi: avvisi prima del ban"
+)
+
+async def limits_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.message
+    chat = msg.chat
+    issuer = msg.from_user
+
+    if not await admin_roster.is_admin(context.bot, chat.id, issuer.id):
+        result = await send_private_or_group_message(
+            issuer_id=issuer.id,
+            chat_id=chat.id,
+            bot=context.bot,
+            text="❌ Solo admin possono usare /limiti."
+        )
+        if result == "group":
+            try:
+                await msg.delete()
+            except:
+                pass
+        return
+
+    args = context.args or []
+    if not args:
+        settings = settings_store.get(chat.id)
+        await msg.reply_text(
+            "⚙️ Limiti del gruppo:\n"
+            f"• cooldown media: {settings.media_cooldown} secondi\n"
+            f"• blocco nuovi utenti: {settings.new_user_window} secondi\n"
+            f"• avvisi prima del ban: {settings.max_warns}"
+        )
+        return
+
+    if len(args) != 2 or args[0] not in LIMITS:
+        await msg.reply_text(USAGE)
+        return
+
+    field, minimum = LIMITS[args[0]]
+    try:
+        value = int(args[1])
+        if value < minimum:
+            raise ValueError
+    except ValueError:
+        await msg.reply_text(f"❌ Valore non valido: serve un intero ≥ {minimum}.")
+        return
+
+    try:
+        await settings_store.set(chat.id, field, value)
+        await msg.reply_text(f"✅ Limite '{args[0]}' impostato a {value}.")
+    except Exception as e:
+        logger.error(f"Errore /limiti {chat.id}: {e}", exc_info=True)
+        await msg.reply_text("❌ Errore durante il salvataggio del limite.")
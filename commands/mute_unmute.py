@@ -1,22 +1,13 @@
 from datetime import datetime, timedelta, timezone
 import re
-import asyncio
 from telegram import Update, ChatPermissions
 from telegram.ext import ContextTypes
 from utils import resolve_target, verified_boosters, recently_muted, send_private_or_group_message
+from cache.admin_roster import admin_roster
 
 DEFAULT_MUTE_DURATION = timedelta(minutes=5)  # Tempo di mute predefinito
 MAX_MUTE_DURATION = timedelta(hours=24)       # Limite massimo di mute (24 ore)
 
-async def send_temp_message(chat_id, bot, text, delay=10):
-    """Invia un messaggio temporaneo che viene cancellato automaticamente dopo `delay` secondi."""
-    message = await bot.send_message(chat_id=chat_id, text=text)
-    await asyncio.sleep(delay)
-    try:
-        await message.delete()
-    except:
-        pass
-
 def parse_duration(time_str: str) -> timedelta:
     time_str = time_str.strip()
     # Modifica il pattern per supportare durate concatenate (es. 1h10m)
@@ -83,8 +74,7 @@ async def mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Verifica permessi admin
     try:
-        member = await context.bot.get_chat_member(chat.id, issuer.id)
-        if member.status not in ("administrator", "creator"):
+        if not await admin_roster.is_admin(context.bot, chat.id, issuer.id):
             result = await send_private_or_group_message(
                 issuer_id=issuer.id,
                 chat_id=chat.id,
@@ -168,8 +158,7 @@ async def mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Controllo admin target
     try:
-        target_member = await context.bot.get_chat_member(chat.id, target.id)
-        if target_member.status in ("administrator", "creator"):
+        if await admin_roster.is_admin(context.bot, chat.id, target.id):
             return await send_private_or_group_message(
                 issuer_id=issuer.id,
                 chat_id=chat.id,
@@ -192,7 +181,7 @@ async def mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             permissions=ChatPermissions(can_send_messages=False),
             until_date=until
         )
-        recently_muted[target.id] = datetime.now(timezone.utc)
+        recently_muted.set(target.id, datetime.now(timezone.utc), ttl=duration.total_seconds())
         await msg.reply_text(f"🔇 {target.full_name} mutato per {format_duration(duration)}.")
     except Exception as e:
         await send_private_or_group_message(
@@ -211,8 +200,7 @@ async def unmute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Verifica permessi admin
     try:
-        member = await context.bot.get_chat_member(chat.id, issuer.id)
-        if member.status not in ("administrator", "creator"):
+        if not await admin_roster.is_admin(context.bot, chat.id, issuer.id):
             result = await send_private_or_group_message(
                 issuer_id=issuer.id,
                 chat_id=chat.id,
@@ -265,8 +253,7 @@ async def unmute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Controllo admin target
     try:
-        target_member = await context.bot.get_chat_member(chat.id, target.id)
-        if target_member.status in ("administrator", "creator"):
+        if await admin_roster.is_admin(context.bot, chat.id, target.id):
             return await send_private_or_group_message(
                 issuer_id=issuer.id,
                 chat_id=chat.id,
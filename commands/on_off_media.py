@@ -1,7 +1,17 @@
-from telegram import Update, ChatMemberOwner
+import asyncio
+import logging
+from telegram import Update
 from telegram.ext import ContextTypes
-from antiflood.mediasystem import immune_users
+from database.immunity_store import immunity_store
 from utils import resolve_target, send_private_or_group_message
+from cache.admin_roster import admin_roster
+from cache.user_directory import user_directory
+
+logger = logging.getLogger(__name__)
+
+# Risoluzioni get_chat contemporanee per /immune_list (solo per gli utenti assenti dalla directory)
+NAME_LOOKUP_CONCURRENCY = 8
+MAX_MESSAGE_LENGTH = 4000
 
 async def immune_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
@@ -12,8 +22,7 @@ async def immune_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Controlla se l'utente è un proprietario del gruppo
-    chat_member = await context.bot.get_chat_member(chat.id, user.id)
-    if not isinstance(chat_member, ChatMemberOwner):
+    if not await admin_roster.is_owner(context.bot, chat.id, user.id):
         await send_private_or_group_message(
             issuer_id=user.id,
             chat_id=chat.id,
@@ -35,29 +44,45 @@ async def immune_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    target_user_id = target_user.id
+    # Aggiungi o rimuovi l'utente dagli immuni di questo gruppo
+    try:
+        immune = await immunity_store.toggle(chat.id, target_user.id)
+    except Exception as e:
+        logger.error(f"Errore salvataggio immunità {chat.id}/{target_user.id}: {e}")
+        await context.bot.send_message(chat_id=chat.id, text="❌ Errore durante il salvataggio dell'immunità.")
+        return
 
-    # Aggiungi o rimuovi l'utente dal set degli utenti immuni
-    if target_user_id in immune_users:
-        immune_users.remove(target_user_id)
+    if immune:
         await context.bot.send_message(
             chat_id=chat.id,
-            text=f"❌ {target_user.first_name} non è più immune al sistema di cooldown."
+            text=f"✅ {target_user.first_name} è ora immune al sistema di cooldown."
         )
     else:
-        immune_users.add(target_user_id)
         await context.bot.send_message(
             chat_id=chat.id,
-            text=f"✅ {target_user.first_name} è ora immune al sistema di cooldown."
+            text=f"❌ {target_user.first_name} non è più immune al sistema di cooldown."
         )
 
+async def _display_name(bot, user_id: int, entry, semaphore: asyncio.Semaphore) -> str:
+    # Voce della directory utenti (cache in memoria / known_users), get_chat solo se sconosciuto
+    if entry is None:
+        try:
+            async with semaphore:
+                entry = await bot.get_chat(user_id)
+            user_directory.observe(entry)
+        except Exception:
+            return f"ID: {user_id}"  # Fallback in caso di errore
+    if entry.username:
+        return f"@{entry.username}"  # Mostra l'username con "@"
+    full_name = f"{entry.first_name} {entry.last_name}" if entry.last_name else entry.first_name
+    return f"{full_name} (ID: {user_id})"  # Nome utente e user_id
+
 async def immune_list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     user = update.effective_user
 
     # Controlla se l'utente è un proprietario del gruppo
-    chat_member = await context.bot.get_chat_member(chat.id, user.id)
-    if not isinstance(chat_member, ChatMemberOwner):
+    if not await admin_roster.is_owner(context.bot, chat.id, user.id):
         await send_private_or_group_message(
             issuer_id=user.id,
             chat_id=chat.id,
@@ -67,6 +92,7 @@ async def immune_list_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
         return
 
+    immune_users = sorted(immunity_store.members(chat.id))
     if not immune_users:
         await context.bot.send_message(
             chat_id=chat.id,
@@ -74,20 +100,24 @@ async def immune_list_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
         return
 
-    immune_list = []
-    for user_id in immune_users:
-        try:
-            chat_member = await context.bot.get_chat(user_id)
-            if chat_member.username:
-                display_name = f"@{chat_member.username}"  # Mostra l'username con "@"
-            else:
-                display_name = f"{chat_member.full_name} (ID: {user_id})"  # Nome utente e user_id
-        except Exception:
-            display_name = f"ID: {user_id}"  # Fallback in caso di errore
-        immune_list.append(f"- {display_name}")
+    # Tutti gli utenti non in cache con una sola query su known_users
+    entries = await user_directory.lookup_many(immune_users)
+    semaphore = asyncio.Semaphore(NAME_LOOKUP_CONCURRENCY)
+    names = await asyncio.gather(*(
+        _display_name(context.bot, user_id, entries.get(user_id), semaphore) for user_id in immune_users
+    ))
+
+    # Più messaggi se l'elenco supera il limite di lunghezza di Telegram
+    chunks = []
+    text = "🛡️ Utenti immuni al sistema di cooldown:"
+    for name in names:
+        line = f"\n- {name}"
+        if len(text) + len(line) > MAX_MESSAGE_LENGTH:
+            chunks.append(text)
+            text = line.lstrip("\n")
+        else:
+            text += line
+    chunks.append(text)
 
-    immune_list_text = "\n".join(immune_list)
-    await context.bot.send_message(
-        chat_id=chat.id,
-        text=f"🛡️ Utenti immuni al sistema di cooldown:\n{immune_list_text}"
-    )
+    for chunk in chunks:
+        await context.bot.send_message(chat_id=chat.id, text=chunk)
@@ -1,9 +1,10 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.error import BadRequest
-from database.db_manager import get_db_session, Settings
+from database.settings_store import settings_store
 import logging
 from telegram.constants import ParseMode
+from cache.admin_roster import admin_roster
 
 logger = logging.getLogger(__name__)
 
@@ -15,23 +16,15 @@ async def premium_on_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     try:
-        chat_member = await context.bot.get_chat_member(chat.id, user.id)
-        if chat_member.status not in ['creator', 'administrator']:
+        if not await admin_roster.is_admin(context.bot, chat.id, user.id):
             await update.message.reply_text("⚠️ Solo gli amministratori possono eseguire questo comando.")
             return
 
-        with get_db_session() as session:
-            setting = session.query(Settings).filter(Settings.key == "premium_check").first()
-            if setting and setting.value == "enabled":
-                await update.message.reply_text("⚠️ Il controllo premium è già attivo.")
-                return
+        if settings_store.get(chat.id).premium_check:
+            await update.message.reply_text("⚠️ Il controllo premium è già attivo.")
+            return
 
-            if not setting:
-                setting = Settings(key="premium_check", value="enabled")
-                session.add(setting)
-            else:
-                setting.value = "enabled"
-            session.commit()
+        await settings_store.set(chat.id, "premium_check", True)
 
         await update.message.reply_text("✅ Controllo premium attivato con successo.")
 
@@ -48,23 +41,15 @@ async def premium_off_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     try:
-        chat_member = await context.bot.get_chat_member(chat.id, user.id)
-        if chat_member.status not in ['creator', 'administrator']:
+        if not await admin_roster.is_admin(context.bot, chat.id, user.id):
             await update.message.reply_text("⚠️ Solo gli amministratori possono eseguire questo comando.")
             return
 
-        with get_db_session() as session:
-            setting = session.query(Settings).filter(Settings.key == "premium_check").first()
-            if setting and setting.value == "disabled":
-                await update.message.reply_text("⚠️ Il controllo premium è già disattivato.")
-                return
+        if not settings_store.get(chat.id).premium_check:
+            await update.message.reply_text("⚠️ Il controllo premium è già disattivato.")
+            return
 
-            if not setting:
-                setting = Settings(key="premium_check", value="disabled")
-                session.add(setting)
-            else:
-                setting.value = "disabled"
-            session.commit()
+        await settings_store.set(chat.id, "premium_check", False)
 
         await update.message.reply_text("✅ Controllo premium disattivato con successo.")
 
@@ -81,23 +66,20 @@ async def premium_status_command(update: Update, context: ContextTypes.DEFAULT_T
         return
 
     try:
-        chat_member = await context.bot.get_chat_member(chat.id, user.id)
-        if chat_member.status not in ['creator', 'administrator']:
+        if not await admin_roster.is_admin(context.bot, chat.id, user.id):
             await update.message.reply_text("⚠️ Solo gli amministratori possono eseguire questo comando.")
             return
 
-        with get_db_session() as session:
-            setting = session.query(Settings).filter(Settings.key == "premium_check").first()
-            if setting and setting.value == "enabled":
-                await update.message.reply_text(
-                    "ℹ️ Il controllo premium è attualmente **attivo**.",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await update.message.reply_text(
-                    "ℹ️ Il controllo premium è attualmente **disattivato**.",
-                    parse_mode=ParseMode.MARKDOWN
-                )
+        if settings_store.get(chat.id).premium_check:
+            await update.message.reply_text(
+                "ℹ️ Il controllo premium è attualmente **attivo**.",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        else:
+            await update.message.reply_text(
+                "ℹ️ Il controllo premium è attualmente **disattivato**.",
+                parse_mode=ParseMode.MARKDOWN
+            )
 
     except Exception as e:
         logger.error(f"Errore durante il controllo dello stato premium: {str(e)}", exc_info=True)
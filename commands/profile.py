@@ -0,0 +1,53 @@
+# /commands/profile.py
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes
+from profiler import profiler
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+USAGE = (
+    "Uso: /profile [avvia|ferma|salva]\n"
+    "• avvia: inizia il campionamento degli handler\n"
+    "• ferma: lo interrompe e salva gli ultimi campioni\n"
+    "• salva: scrive subito i campioni raccolti\n"
+    "Senza argomenti mostra lo stato."
+)
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.message
+    issuer = msg.from_user
+
+    # Comando del proprietario del bot: la profilazione riguarda tutto il processo, non un gruppo
+    if not config.BOT_OWNER_ID or issuer.id != config.BOT_OWNER_ID:
+        return
+
+    if not config.PROFILE_ENABLED:
+        await msg.reply_text("ℹ️ Profilazione non disponibile: avvia il bot con PROFILE_ENABLED=1.")
+        return
+
+    args = context.args or []
+    action = args[0].lower() if args else None
+
+    if action is None:
+        per_handler = profiler.snapshot()
+        top = "\n".join(f"• {handler}: {count}" for handler, count in per_handler.most_common(5)) or "• nessun campione"
+        await msg.reply_text(
+            f"📈 Profilazione {'attiva' if profiler.running else 'ferma'}\n"
+            f"Campioni dall'ultimo salvataggio per handler:\n{top}"
+        )
+    elif action == "avvia":
+        profiler.start()
+        await msg.reply_text(f"✅ Profilazione avviata (salvataggio ogni {config.PROFILE_DUMP_INTERVAL:g} secondi).")
+    elif action == "ferma":
+        path = profiler.stop()
+        await msg.reply_text(f"⏹ Profilazione fermata.{f' Ultimi campioni in {path}' if path else ''}")
+    elif action == "salva":
+        path = profiler.dump()
+        await msg.reply_text(f"💾 Profilo salvato in {path}" if path else "ℹ️ Nessun campione da salvare.")
+    else:
+        await msg.reply_text(USAGE)
@@ -1,17 +1,15 @@
 # /commands/warn_ban.py
 
 import logging
-from datetime import datetime, timezone
 from telegram import Update
 from telegram.ext import ContextTypes
 from utils import resolve_target, send_private_or_group_message
+from database.settings_store import settings_store
+from database.warn_ledger import warn_ledger
+from cache.admin_roster import admin_roster
 
 logger = logging.getLogger(__name__)
 
-# Stato temporaneo in RAM
-user_warns = {}  # user_id -> [datetime1, datetime2, ...]
-
-MAX_WARNS = 3
 
 # ——— /warn ——————————————————————————————
 async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -19,8 +17,7 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = msg.chat
     issuer = msg.from_user
 
-    member = await context.bot.get_chat_member(chat.id, issuer.id)
-    if member.status not in ("administrator", "creator"):
+    if not await admin_roster.is_admin(context.bot, chat.id, issuer.id):
         result = await send_private_or_group_message(
             issuer_id=issuer.id,
             chat_id=chat.id,
@@ -49,7 +46,7 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 pass
         return
 
-    if (await context.bot.get_chat_member(chat.id, target.id)).status in ("administrator", "creator"):
+    if await admin_roster.is_admin(context.bot, chat.id, target.id):
         result = await send_private_or_group_message(
             issuer_id=issuer.id,
             chat_id=chat.id,
@@ -63,16 +60,16 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 pass
         return
 
-    now = datetime.now(timezone.utc)
-    warns = user_warns.setdefault(target.id, [])
-    warns.append(now)
+    # Avvisi per gruppo, scadono dopo WARN_EXPIRY_DAYS giorni (gli update della stessa chat sono sequenziali)
+    warns = await warn_ledger.add(chat.id, target.id)
+    max_warns = settings_store.get(chat.id).max_warns
 
-    if len(warns) >= MAX_WARNS:
+    if warns >= max_warns:
         try:
             await context.bot.ban_chat_member(chat.id, target.id)
-            user_warns.pop(target.id, None)
-            await msg.reply_text(f"🚫 {target.full_name} è stato bannato (3/3 avvisi).")
-            logger.info("User %s bannato per 3 warn", target.id)
+            await warn_ledger.clear(chat.id, target.id)
+            await msg.reply_text(f"🚫 {target.full_name} è stato bannato ({max_warns}/{max_warns} avvisi).")
+            logger.info("User %s bannato per %s warn", target.id, max_warns)
         except Exception as e:
             logger.error("Errore nel bannare %s: %s", target.id, e)
             await send_private_or_group_message(
@@ -82,7 +79,7 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 text="❌ Errore nel bannare."
             )
     else:
-        await msg.reply_text(f"⚠️ {target.full_name} ha ricevuto un avviso ({len(warns)}/{MAX_WARNS})")
+        await msg.reply_text(f"⚠️ {target.full_name} ha ricevuto un avviso ({warns}/{max_warns})")
 
 # ——— /ban ——————————————————————————————
 async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -90,8 +87,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = msg.chat
     issuer = msg.from_user
 
-    member = await context.bot.get_chat_member(chat.id, issuer.id)
-    if member.status not in ("administrator", "creator"):
+    if not await admin_roster.is_admin(context.bot, chat.id, issuer.id):
         result = await send_private_or_group_message(
             issuer_id=issuer.id,
             chat_id=chat.id,
@@ -120,7 +116,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 pass
         return
 
-    if (await context.bot.get_chat_member(chat.id, target.id)).status in ("administrator", "creator"):
+    if await admin_roster.is_admin(context.bot, chat.id, target.id):
         result = await send_private_or_group_message(
             issuer_id=issuer.id,
             chat_id=chat.id,
@@ -136,7 +132,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         await context.bot.ban_chat_member(chat.id, target.id)
-        user_warns.pop(target.id, None)
+        await warn_ledger.clear(chat.id, target.id)
         await msg.reply_text(f"🚫 {target.full_name} è stato bannato.")
         logger.info("User %s bannato con /rban", target.id)
     except Exception as e:
@@ -154,8 +150,7 @@ async def unwarn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = msg.chat
     issuer = msg.from_user
 
-    member = await context.bot.get_chat_member(chat.id, issuer.id)
-    if member.status not in ("administrator", "creator"):
+    if not await admin_roster.is_admin(context.bot, chat.id, issuer.id):
         result = await send_private_or_group_message(
             issuer_id=issuer.id,
             chat_id=chat.id,
@@ -186,13 +181,13 @@ async def unwarn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         num_warns_to_remove = int(context.args[1]) if len(context.args) > 1 else 1
-        warns = user_warns.get(target.id, [])
-        if not warns:
+        if num_warns_to_remove < 1:
+            raise ValueError(num_warns_to_remove)
+        removed_warns = await warn_ledger.remove(chat.id, target.id, num_warns_to_remove)
+        if not removed_warns:
             await msg.reply_text(f"ℹ️ {target.full_name} non ha avvisi.")
             return
 
-        removed_warns = min(num_warns_to_remove, len(warns))
-        user_warns[target.id] = warns[removed_warns:]
         await msg.reply_text(f"✅ Rimossi {removed_warns} avvisi per {target.full_name}.")
     except ValueError:
         result = await send_private_or_group_message(
@@ -0,0 +1,96 @@
+# /concurrency.py
+"""
+Elaborazione concorrente degli update con ordine garantito per chat.
+
+Gli update di gruppi diversi girano in parallelo; quelli della stessa chat
+(o dello stesso utente, se l'update non ha una chat) uno alla volta e nell'ordine di arrivo.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class _Slot:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class KeyedLock:
+    """Un lock per chiave, creato al primo uso e rimosso quando nessuno lo usa più"""
+
+    def __init__(self):
+        self._slots = {}
+
+    @asynccontextmanager
+    async def hold(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+        slot.users += 1
+        try:
+            # asyncio.Lock è FIFO: chi arriva prima entra prima
+            async with slot.lock:
+                yield
+        finally:
+            slot.users -= 1
+            if not slot.users:
+                del self._slots[key]
+
+    def __len__(self):
+        return len(self._slots)
+
+
+# Sezioni critiche per utente su stato condiviso tra gruppi (avvisi, registrazione premium)
+user_locks = KeyedLock()
+
+
+def sequence_key(update: object):
+    """Chiave di ordinamento di un update: la chat, altrimenti l'utente, altrimenti nessuna"""
+    if not isinstance(update, Update):
+        return None
+    chat = update.effective_chat
+    if chat is not None:
+        return chat.id
+    user = update.effective_user
+    if user is not None:
+        return ("user", user.id)
+    return None
+
+
+class ChatSequencer(BaseUpdateProcessor):
+    """Update processor: parallelo tra chat diverse, sequenziale all'interno della stessa chat"""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks = KeyedLock()
+        self.in_flight = 0  # update ricevuti e non ancora terminati (in attesa o in esecuzione)
+
+    async def process_update(self, update, coroutine):
+        self.in_flight += 1
+        try:
+            key = sequence_key(update)
+            if key is None:
+                await super().process_update(update, coroutine)
+                return
+            # Il lock della chat si prende prima del semaforo globale: gli update in coda
+            # di una chat molto attiva non occupano posti destinati agli altri gruppi
+            async with self._chat_locks.hold(key):
+                await super().process_update(update, coroutine)
+        finally:
+            self.in_flight -= 1
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def pending_chats(self) -> int:
+        return len(self._chat_locks)
@@ -1,5 +1,6 @@
 # config.py
 import os
+import secrets
 import urllib.parse
 from dotenv import load_dotenv
 
@@ -13,8 +14,86 @@ class Config:
         self.API_ID = int(self._get_mandatory("API_ID"))  
         self.API_HASH = self._get_mandatory("API_HASH")
         self.DATABASE_URL = self._get_database_url()
+        self.ASYNC_DATABASE_URL = self._get_async_database_url(self.DATABASE_URL)
         self.BOOST_LINK = os.getenv("BOOST_LINK", f"https://t.me/{self.bot_username}?startgroup=true")
 
+        # Cache dello stato PremiumUser (numero massimo di utenti e validità in secondi)
+        self.PREMIUM_CACHE_SIZE = int(os.getenv("PREMIUM_CACHE_SIZE", "50000"))
+        self.PREMIUM_CACHE_TTL = int(os.getenv("PREMIUM_CACHE_TTL", "3600"))
+        # Scritture premium_users raggruppate: secondi tra due flush e utenti in coda che forzano il flush
+        self.PREMIUM_FLUSH_INTERVAL = float(os.getenv("PREMIUM_FLUSH_INTERVAL", "2"))
+        self.PREMIUM_FLUSH_SIZE = int(os.getenv("PREMIUM_FLUSH_SIZE", "500"))
+
+        # Secondi dopo cui l'elenco admin di un gruppo viene ricaricato da get_chat_administrators
+        self.ADMIN_ROSTER_TTL = int(os.getenv("ADMIN_ROSTER_TTL", "900"))
+
+        # Directory utenti (ID/username/nome) usata da resolve_target
+        self.USER_DIRECTORY_SIZE = int(os.getenv("USER_DIRECTORY_SIZE", "200000"))
+        self.USER_DIRECTORY_TTL = int(os.getenv("USER_DIRECTORY_TTL", str(7 * 24 * 3600)))
+        self.USER_DIRECTORY_FLUSH_INTERVAL = int(os.getenv("USER_DIRECTORY_FLUSH_INTERVAL", "30"))
+        # Ultimi messaggi ricordati per gruppo (autori per i comandi multipli su un intervallo di messaggi)
+        self.RECENT_AUTHORS_PER_CHAT = int(os.getenv("RECENT_AUTHORS_PER_CHAT", "300"))
+
+        # Budget antiflood per tipo di media, es. "sticker=bucket:3/60,video=window:2/300"
+        self.MEDIA_POLICIES = os.getenv("MEDIA_POLICIES", "")
+
+        # Giorni dopo cui gli avvisi (/rwarn) scadono
+        self.WARN_EXPIRY_DAYS = int(os.getenv("WARN_EXPIRY_DAYS", "30"))
+        # Cache dei conteggi avvisi per (gruppo, utente) e intervallo di salvataggio in blocco
+        self.WARN_CACHE_SIZE = int(os.getenv("WARN_CACHE_SIZE", "10000"))
+        self.WARN_CACHE_TTL = int(os.getenv("WARN_CACHE_TTL", "600"))
+        self.WARN_FLUSH_INTERVAL = int(os.getenv("WARN_FLUSH_INTERVAL", "5"))
+
+        # Comandi multipli: azioni API in parallelo e numero massimo di utenti per comando
+        self.BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "8"))
+        self.BULK_MAX_TARGETS = int(os.getenv("BULK_MAX_TARGETS", "50"))
+
+        # Snapshot dello stato di moderazione in RAM nel database (base binaria + journal incrementale)
+        self.STATE_SNAPSHOT_INTERVAL = int(os.getenv("STATE_SNAPSHOT_INTERVAL", "15"))
+
+        # Benvenuto: secondi di attesa per raggruppare gli ingressi e menzioni massime per messaggio
+        self.WELCOME_BATCH_DELAY = float(os.getenv("WELCOME_BATCH_DELAY", "3"))
+        self.WELCOME_MAX_MENTIONS = int(os.getenv("WELCOME_MAX_MENTIONS", "10"))
+
+        # Secondi tra due controlli delle cancellazioni programmate
+        self.DELETION_TICK = float(os.getenv("DELETION_TICK", "1"))
+
+        # Update elaborati in parallelo (ordine garantito solo all'interno della stessa chat)
+        self.MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+
+        # Limiti delle chiamate in uscita (richieste/secondo globali, messaggi/minuto per gruppo, tentativi su RetryAfter)
+        self.OUTBOUND_GLOBAL_RATE = int(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+        self.OUTBOUND_GROUP_PER_MINUTE = int(os.getenv("OUTBOUND_GROUP_PER_MINUTE", "20"))
+        self.OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+        # Modalità webhook: attiva se WEBHOOK_URL (URL pubblico del bot) è impostato, altrimenti polling
+        self.WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+        self.WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+        self.WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+        self.WEBHOOK_PATH = "/" + os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+        # Senza segreto configurato se ne genera uno a ogni avvio (viene registrato con set_webhook)
+        self.WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+        self.WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+        self.WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+        # Endpoint delle metriche in formato Prometheus (GET /metrics); porta 0 = disattivato
+        self.METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+        self.METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+        # Registrazione anonimizzata degli update in ingresso (JSONL per benchmarks/replay.py); vuoto = disattivata
+        self.RECORD_UPDATES_PATH = os.getenv("RECORD_UPDATES_PATH", "")
+        # Sale degli pseudonimi: fisso per confrontare registrazioni diverse, altrimenti nuovo a ogni avvio
+        self.RECORD_SALT = os.getenv("RECORD_SALT") or secrets.token_hex(16)
+        self.RECORD_FLUSH_INTERVAL = float(os.getenv("RECORD_FLUSH_INTERVAL", "5"))
+
+        # Proprietario del bot (comandi che riguardano tutto il processo, es. /profile); 0 = nessuno
+        self.BOT_OWNER_ID = int(os.getenv("BOT_OWNER_ID", "0"))
+        # Profilazione a campionamento degli handler: campioni ogni PROFILE_SAMPLE_MS ms, file in PROFILE_DIR
+        self.PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "").lower() in ("1", "true", "yes")
+        self.PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+        self.PROFILE_SAMPLE_MS = float(os.getenv("PROFILE_SAMPLE_MS", "5"))
+        self.PROFILE_DUMP_INTERVAL = float(os.getenv("PROFILE_DUMP_INTERVAL", "60"))
+
     @property
     def is_production(self):
         return bool(os.getenv("RAILWAY_ENVIRONMENT"))
@@ -32,6 +111,16 @@ class Config:
             return self._adjust_postgresql_url(url)
         return url
 
+    def _get_async_database_url(self, url: str) -> str:
+        """Converte la connection string per il driver asincrono (aiosqlite / psycopg)"""
+        if url.startswith("sqlite:///"):
+            return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+        for prefix in ("postgres://", "postgresql://", "postgresql+psycopg2://"):
+            if url.startswith(prefix):
+                # psycopg 3 accetta gli stessi parametri libpq (sslmode, keepalives, ...)
+                return url.replace(prefix, "postgresql+psycopg://", 1)
+        return url
+
     def _adjust_postgresql_url(self, raw_url: str) -> str:
         """Aggiusta la connection string per PostgreSQL su Railway"""
         parsed = urllib.parse.urlparse(raw_url)
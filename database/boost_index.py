@@ -0,0 +1,96 @@
+# /database/boost_index.py
+import logging
+import time
+from datetime import datetime, timezone
+from sqlalchemy import delete, select
+from database.db_manager import get_async_db_session, dialect_insert, as_utc, ChatBoostRecord
+from database.premium_cache import set_boosted
+
+logger = logging.getLogger(__name__)
+
+
+class BoostIndex:
+    """
+    Boost attivi per (chat_id, user_id), caricati all'avvio dalla tabella chat_boosts e tenuti
+    aggiornati dagli update di boost: is_boosting() decide senza chiamate API né query.
+    PremiumUser.has_boosted resta allineato (True finché l'utente ha almeno un boost attivo)
+    tramite la coda write-behind di database.premium_cache.
+    """
+
+    def __init__(self):
+        self._boosts = {}  # (chat_id, user_id) -> {boost_id: scadenza epoch}
+        self._owners = {}  # (chat_id, boost_id) -> user_id
+        self._chats = {}   # user_id -> chat_id in cui ha boost registrati
+
+    async def load(self):
+        now = datetime.now(timezone.utc)
+        async with get_async_db_session() as session:
+            await session.execute(delete(ChatBoostRecord).where(ChatBoostRecord.expires_at <= now))
+            rows = (await session.execute(select(ChatBoostRecord))).scalars().all()
+
+        self._boosts, self._owners, self._chats = {}, {}, {}
+        for row in rows:
+            self._remember(row.chat_id, row.user_id, row.boost_id, as_utc(row.expires_at).timestamp())
+        logger.info(f"Boost attivi caricati: {len(rows)}")
+
+    def _remember(self, chat_id: int, user_id: int, boost_id: str, expires_at: float):
+        self._boosts.setdefault((chat_id, user_id), {})[boost_id] = expires_at
+        self._owners[(chat_id, boost_id)] = user_id
+        self._chats.setdefault(user_id, set()).add(chat_id)
+
+    def _forget(self, chat_id: int, boost_id: str):
+        user_id = self._owners.pop((chat_id, boost_id), None)
+        if user_id is None:
+            return None
+        boosts = self._boosts.get((chat_id, user_id))
+        if boosts is not None:
+            boosts.pop(boost_id, None)
+            if not boosts:
+                del self._boosts[(chat_id, user_id)]
+                chats = self._chats.get(user_id)
+                if chats is not None:
+                    chats.discard(chat_id)
+                    if not chats:
+                        del self._chats[user_id]
+        return user_id
+
+    def is_boosting(self, chat_id: int, user_id: int) -> bool:
+        boosts = self._boosts.get((chat_id, user_id))
+        if not boosts:
+            return False
+        now = time.time()
+        return any(expires_at > now for expires_at in boosts.values())
+
+    def _boosting_anywhere(self, user_id: int) -> bool:
+        return any(self.is_boosting(chat_id, user_id) for chat_id in self._chats.get(user_id, ()))
+
+    async def add(self, chat_id: int, user_id: int, boost_id: str, expiration_date: datetime):
+        """Registra un boost (update chat_boost o verifica via API) e marca l'utente come booster"""
+        boost_stmt = dialect_insert(ChatBoostRecord).values(
+            chat_id=chat_id, user_id=user_id, boost_id=boost_id, expires_at=expiration_date
+        )
+        boost_stmt = boost_stmt.on_conflict_do_update(
+            index_elements=[ChatBoostRecord.chat_id, ChatBoostRecord.boost_id],
+            set_={"user_id": boost_stmt.excluded.user_id, "expires_at": boost_stmt.excluded.expires_at}
+        )
+        async with get_async_db_session() as session:
+            await session.execute(boost_stmt)
+
+        self._forget(chat_id, boost_id)
+        self._remember(chat_id, user_id, boost_id, expiration_date.timestamp())
+        set_boosted(user_id, True)
+
+    async def remove(self, chat_id: int, boost_id: str):
+        """Boost rimosso o scaduto; restituisce l'utente che lo aveva fatto (se noto)"""
+        user_id = self._forget(chat_id, boost_id)
+        async with get_async_db_session() as session:
+            await session.execute(
+                delete(ChatBoostRecord).where(ChatBoostRecord.chat_id == chat_id, ChatBoostRecord.boost_id == boost_id)
+            )
+
+        if user_id is not None and not self._boosting_anywhere(user_id):
+            set_boosted(user_id, False)
+        return user_id
+
+
+boost_index = BoostIndex()
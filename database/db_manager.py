@@ -1,18 +1,26 @@
 # /database/db_manager.py
-from sqlalchemy import create_engine, Column, Boolean, BigInteger, DateTime, Index, String
+from sqlalchemy import create_engine, Column, Boolean, BigInteger, DateTime, Index, Integer, LargeBinary, String
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import inspect
-from contextlib import contextmanager
+from sqlalchemy import inspect, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from contextlib import contextmanager, asynccontextmanager
 import os
 from dotenv import load_dotenv
 import logging
+import time
+from datetime import datetime, timezone
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
+from metrics import db_query_seconds, db_pool_checkout_seconds
 
 DATABASE_URL = config.DATABASE_URL
+ASYNC_DATABASE_URL = config.ASYNC_DATABASE_URL
 
 # Configurazione logging
 logging.basicConfig(
@@ -24,20 +32,54 @@ logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
-# Configurazione motore ottimizzata per PostgreSQL
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=15,
-    max_overflow=5,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    connect_args={
-        "options": "-c timezone=UTC",
-        "connect_timeout": 5,
-        "application_name": "RottenShieldBot"
+def _engine_options(url: str) -> dict:
+    """Opzioni del motore: pool e parametri libpq solo per PostgreSQL"""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": 15,
+        "max_overflow": 5,
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+        "connect_args": {
+            "options": "-c timezone=UTC",
+            "connect_timeout": 5,
+            "application_name": "RottenShieldBot"
+        }
     }
+
+# Configurazione motore ottimizzata per PostgreSQL
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+class TimedAsyncPool(AsyncAdaptedQueuePool):
+    """Pool del motore asincrono che misura l'attesa per ottenere una connessione"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            db_pool_checkout_seconds.observe(time.perf_counter() - started)
+
+# Motore asincrono per gli handler: non blocca l'event loop durante le query
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=TimedAsyncPool,
+    **_engine_options(ASYNC_DATABASE_URL)
 )
 
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+@event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    if started is None:
+        return
+    # Etichetta a bassa cardinalità: solo il tipo di istruzione (SELECT, INSERT, ...)
+    db_query_seconds.observe(time.perf_counter() - started, statement.lstrip().split(None, 1)[0].upper())
+
 # Configurazione session maker
 SessionLocal = sessionmaker(
     bind=engine,
@@ -46,6 +88,13 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 class PremiumUser(Base):
     """Modello per tracciare gli utenti premium e i loro boost"""
     __tablename__ = "premium_users"
@@ -63,7 +112,7 @@ class PremiumUser(Base):
         return f"<PremiumUser {self.user_id} Boosted: {self.has_boosted}>"
 
 class Settings(Base):
-    """Tabella per gestire le impostazioni globali del bot"""
+    """Tabella per gestire le impostazioni del bot (globali o "<chat_id>:<chiave>" per gruppo)"""
     __tablename__ = "settings"
     
     key = Column(String, primary_key=True)
@@ -72,6 +121,81 @@ class Settings(Base):
     def __repr__(self):
         return f"<Settings {self.key}: {self.value}>"
 
+class KnownUser(Base):
+    """Directory degli utenti visti dal bot (per risolvere ID e username senza API)"""
+    __tablename__ = "known_users"
+
+    user_id = Column(BigInteger, primary_key=True)
+    username = Column(String, index=True)  # minuscolo, senza '@'
+    first_name = Column(String, nullable=False, default="")
+    last_name = Column(String)
+    updated_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<KnownUser {self.user_id} @{self.username}>"
+
+class PendingDeletion(Base):
+    """Messaggi del bot da cancellare più tardi (sopravvivono a un riavvio)"""
+    __tablename__ = "pending_deletions"
+
+    chat_id = Column(BigInteger, primary_key=True)
+    message_id = Column(BigInteger, primary_key=True)
+    delete_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<PendingDeletion {self.chat_id}/{self.message_id} @ {self.delete_at}>"
+
+class Warn(Base):
+    """Registro degli avvisi per gruppo (un record per avviso)"""
+    __tablename__ = "warns"
+
+    # Integer su SQLite: solo INTEGER PRIMARY KEY è autoincrementale
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    __table_args__ = (
+        # Conteggio degli avvisi attivi: ricerca per intervallo su (chat, utente, data)
+        Index("idx_warns_chat_user_created", "chat_id", "user_id", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<Warn {self.chat_id}/{self.user_id} @ {self.created_at}>"
+
+class Immunity(Base):
+    """Utenti immuni all'antiflood media, per gruppo"""
+    __tablename__ = "immunities"
+
+    chat_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    granted_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<Immunity {self.chat_id}/{self.user_id}>"
+
+class ChatBoostRecord(Base):
+    """Boost attivi per gruppo, alimentati dagli update chat_boost / removed_chat_boost"""
+    __tablename__ = "chat_boosts"
+
+    chat_id = Column(BigInteger, primary_key=True)
+    boost_id = Column(String, primary_key=True)
+    user_id = Column(BigInteger, nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<ChatBoostRecord {self.chat_id}/{self.user_id} {self.boost_id}>"
+
+class StateSnapshotBlock(Base):
+    """Snapshot binario dello stato antiflood: il blocco con seq minore è la base, i successivi il journal"""
+    __tablename__ = "state_snapshots"
+
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    data = Column(LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f"<StateSnapshotBlock {self.seq} ({len(self.data)} byte)>"
+
 @contextmanager
 def get_db_session():
     """Fornisce una sessione DB con gestione automatica degli errori"""
@@ -86,10 +210,38 @@ def get_db_session():
     finally:
         session.close()
 
-def is_premium_check_enabled(session):
-    """Verifica se il controllo premium è attivo"""
-    setting = session.query(Settings).filter(Settings.key == "premium_check").first()
-    return setting and setting.value == "enabled"
+@asynccontextmanager
+async def get_async_db_session():
+    """Versione asincrona di get_db_session da usare negli handler"""
+    session = AsyncSessionLocal()
+    try:
+        yield session
+        await session.commit()
+    except SQLAlchemyError as e:
+        await session.rollback()
+        logger.error(f"Database error: {e}", exc_info=True)
+        raise
+    finally:
+        await session.close()
+
+def as_utc(moment: datetime) -> datetime:
+    """SQLite restituisce datetime senza fuso: i valori sono salvati in UTC"""
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+def dialect_insert(model):
+    """insert() del dialetto in uso, con supporto a ON CONFLICT (PostgreSQL e SQLite)"""
+    if async_engine.dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+async def create_missing_tables():
+    """Crea le tabelle mancanti (quelle esistenti non vengono toccate)"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def dispose_async_engine():
+    """Chiude le connessioni del motore asincrono (da chiamare allo spegnimento)"""
+    await async_engine.dispose()
 
 def init_db():
     """Inizializzazione database con controlli avanzati"""
@@ -0,0 +1,63 @@
+# /database/immunity_store.py
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import delete, select
+from database.db_manager import get_async_db_session, dialect_insert, Immunity
+
+logger = logging.getLogger(__name__)
+
+
+class ImmunityStore:
+    """
+    Utenti immuni all'antiflood per gruppo: tabella immunities caricata all'avvio in un set per chat.
+    is_immune() non tocca mai il database; le modifiche sono write-through.
+    """
+
+    def __init__(self):
+        self._chats = {}  # chat_id -> set(user_id)
+
+    async def load(self):
+        async with get_async_db_session() as session:
+            rows = (await session.execute(select(Immunity.chat_id, Immunity.user_id))).all()
+
+        chats = {}
+        for chat_id, user_id in rows:
+            chats.setdefault(chat_id, set()).add(user_id)
+        self._chats = chats
+        logger.info(f"Immunità caricate: {len(rows)} utenti in {len(chats)} gruppi")
+
+    def is_immune(self, chat_id: int, user_id: int) -> bool:
+        users = self._chats.get(chat_id)
+        return users is not None and user_id in users
+
+    def members(self, chat_id: int) -> set:
+        return set(self._chats.get(chat_id, ()))
+
+    async def set(self, chat_id: int, user_id: int, immune: bool):
+        if immune:
+            stmt = dialect_insert(Immunity).values(
+                chat_id=chat_id, user_id=user_id, granted_at=datetime.now(timezone.utc)
+            ).on_conflict_do_nothing(index_elements=[Immunity.chat_id, Immunity.user_id])
+        else:
+            stmt = delete(Immunity).where(Immunity.chat_id == chat_id, Immunity.user_id == user_id)
+        async with get_async_db_session() as session:
+            await session.execute(stmt)
+
+        # Memoria aggiornata solo dopo il commit
+        if immune:
+            self._chats.setdefault(chat_id, set()).add(user_id)
+        else:
+            users = self._chats.get(chat_id)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self._chats[chat_id]
+
+    async def toggle(self, chat_id: int, user_id: int) -> bool:
+        """Inverte l'immunità e restituisce il nuovo stato"""
+        immune = not self.is_immune(chat_id, user_id)
+        await self.set(chat_id, user_id, immune)
+        return immune
+
+
+immunity_store = ImmunityStore()
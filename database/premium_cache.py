@@ -0,0 +1,156 @@
+# /database/premium_cache.py
+import asyncio
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from cache.ttl_lru import TTLCache, MISSING
+from database.db_manager import get_async_db_session, dialect_insert, PremiumUser
+from concurrency import user_locks
+from metrics import Gauge
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# user_id -> has_boosted (True/False) oppure None se l'utente non è registrato
+premium_cache = TTLCache(maxsize=config.PREMIUM_CACHE_SIZE, ttl=config.PREMIUM_CACHE_TTL)
+
+Gauge("bot_premium_cache_entries", "Voci nella cache dello stato premium", lambda: premium_cache.stats()["size"])
+Gauge(
+    "bot_premium_cache_lookups", "Letture della cache premium dall'avvio, per esito",
+    lambda: {("hit",): premium_cache.hits, ("miss",): premium_cache.misses}, ("result",)
+)
+Gauge(
+    "bot_premium_cache_removed", "Voci rimosse dalla cache premium dall'avvio, per motivo",
+    lambda: {("eviction",): premium_cache.evictions, ("expiration",): premium_cache.expirations}, ("reason",)
+)
+
+async def get_premium_state(user_id: int):
+    """
+    Stato boost dell'utente premium, letto dalla cache e solo in caso di miss dal database.
+    Restituisce True/False se registrato, None se non presente in premium_users.
+    """
+    state = premium_cache.get(user_id)
+    if state is not MISSING:
+        return state
+    pending = premium_writes.pending_state(user_id)
+    if pending is not MISSING:
+        return pending
+
+    # Messaggi dello stesso utente in più gruppi: una sola query, gli altri leggono la cache
+    async with user_locks.hold(user_id):
+        state = premium_cache.get(user_id)
+        if state is not MISSING:
+            return state
+
+        async with get_async_db_session() as session:
+            result = await session.execute(
+                select(PremiumUser.has_boosted).where(PremiumUser.user_id == user_id)
+            )
+            row = result.first()
+
+        state = bool(row.has_boosted) if row else None
+        premium_cache.set(user_id, state)
+        return state
+
+class PremiumWriteBehind:
+    """
+    Coda write-behind per premium_users: registrazioni e cambi di stato boost vengono
+    raccolti in memoria (la cache è aggiornata subito) e scritti con INSERT multi-riga ON CONFLICT,
+    ogni `interval` secondi (job) o appena la coda raggiunge `max_pending` utenti.
+    """
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._registrations = set()  # user_id nuovi (non boostati)
+        self._boosts = {}            # user_id -> (has_boosted, boost_verified_at o None)
+        self._flush_task = None
+        # Un flush alla volta (job periodico o coda piena): i blocchi arrivano al DB nell'ordine in cui sono stati presi
+        self._lock = asyncio.Lock()
+
+    def pending_state(self, user_id: int):
+        if user_id in self._boosts:
+            return self._boosts[user_id][0]
+        if user_id in self._registrations:
+            return False
+        return MISSING
+
+    def register(self, user_id: int):
+        if user_id not in self._boosts:
+            self._registrations.add(user_id)
+        self._maybe_flush()
+
+    def set_boosted(self, user_id: int, has_boosted: bool):
+        self._boosts[user_id] = (has_boosted, datetime.now(timezone.utc) if has_boosted else None)
+        self._registrations.discard(user_id)
+        self._maybe_flush()
+
+    def __len__(self):
+        return len(self._registrations) + len(self._boosts)
+
+    def _maybe_flush(self):
+        if len(self) >= self.max_pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._registrations and not self._boosts:
+            return
+        registrations, self._registrations = self._registrations, set()
+        boosts, self._boosts = self._boosts, {}
+
+        try:
+            async with get_async_db_session() as session:
+                if registrations:
+                    stmt = dialect_insert(PremiumUser).values(
+                        [{"user_id": user_id, "has_boosted": False} for user_id in registrations]
+                    )
+                    await session.execute(stmt.on_conflict_do_nothing(index_elements=[PremiumUser.user_id]))
+                if boosts:
+                    stmt = dialect_insert(PremiumUser).values([
+                        {"user_id": user_id, "has_boosted": has_boosted, "boost_verified_at": verified_at}
+                        for user_id, (has_boosted, verified_at) in boosts.items()
+                    ])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[PremiumUser.user_id],
+                        set_={
+                            "has_boosted": stmt.excluded.has_boosted,
+                            # Una rimozione non cancella la data dell'ultima verifica
+                            "boost_verified_at": func.coalesce(stmt.excluded.boost_verified_at, PremiumUser.boost_verified_at),
+                        }
+                    )
+                    await session.execute(stmt)
+            logger.debug(f"premium_users: {len(registrations)} registrazioni, {len(boosts)} aggiornamenti boost")
+        except Exception as e:
+            # Rimette in coda senza sovrascrivere modifiche più recenti
+            for user_id in registrations:
+                if user_id not in self._boosts:
+                    self._registrations.add(user_id)
+            for user_id, value in boosts.items():
+                self._boosts.setdefault(user_id, value)
+            logger.error(f"Errore salvataggio premium_users: {str(e)}")
+
+
+premium_writes = PremiumWriteBehind(max_pending=config.PREMIUM_FLUSH_SIZE)
+
+def register_premium_user(user_id: int):
+    """Registra un nuovo utente premium (non boostato): cache subito, database al prossimo flush"""
+    state = premium_cache.get(user_id)
+    if state is not MISSING and state is not None:
+        return  # già registrato
+    premium_cache.set(user_id, False)
+    premium_writes.register(user_id)
+
+def set_boosted(user_id: int, has_boosted: bool):
+    """Aggiorna lo stato boost: cache subito, database al prossimo flush"""
+    premium_cache.set(user_id, has_boosted)
+    premium_writes.set_boosted(user_id, has_boosted)
+
+async def flush_premium_writes(context=None):
+    """Job periodico di salvataggio della coda premium_users"""
+    await premium_writes.flush()
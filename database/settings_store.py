@@ -0,0 +1,139 @@
+# /database/settings_store.py
+import logging
+from dataclasses import dataclass, fields, replace
+from sqlalchemy import select
+from database.db_manager import get_async_db_session, Settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChatSettings:
+    """Impostazioni di un gruppo (i default valgono per i gruppi non configurati)"""
+    premium_check: bool = False
+    media_cooldown: int = 60      # secondi tra due media
+    new_user_window: int = 1800   # secondi di blocco media per i nuovi utenti
+    max_warns: int = 3
+
+
+_FIELD_TYPES = {f.name: f.type for f in fields(ChatSettings)}
+
+
+def _parse(name: str, raw: str):
+    if _FIELD_TYPES[name] is bool:
+        return raw == "enabled"
+    return int(raw)
+
+
+def _format(value) -> str:
+    if isinstance(value, bool):
+        return "enabled" if value else "disabled"
+    return str(int(value))
+
+
+def _split_key(key: str):
+    """'-100123:max_warns' -> (-100123, 'max_warns'); 'premium_check' -> (None, 'premium_check')"""
+    chat_part, _, name = key.rpartition(":")
+    if not chat_part:
+        return None, name
+    try:
+        return int(chat_part), name
+    except ValueError:
+        return None, None
+
+
+class SettingsStore:
+    """
+    Snapshot in memoria della tabella settings.
+    Le letture (get) non toccano mai il database; ogni scrittura ricarica solo la chat modificata.
+    Le chiavi senza prefisso sono i default globali, quelle "<chat_id>:<campo>" valgono per un solo gruppo.
+    """
+
+    def __init__(self):
+        self._defaults = ChatSettings()
+        self._snapshot = {}  # chat_id -> ChatSettings
+        self._values = {}    # chiavi globali che non sono impostazioni di gruppo (es. file_id del benvenuto)
+
+    async def load(self):
+        """Carica l'intera tabella in un solo passaggio (da chiamare all'avvio)"""
+        async with get_async_db_session() as session:
+            rows = (await session.execute(select(Settings))).scalars().all()
+
+        global_values = {}
+        chat_values = {}
+        self._values = {}
+        for row in rows:
+            chat_id, name = _split_key(row.key)
+            if name not in _FIELD_TYPES:
+                if chat_id is None and name:
+                    self._values[name] = row.value
+                continue
+            try:
+                value = _parse(name, row.value)
+            except ValueError:
+                logger.warning(f"Impostazione non valida ignorata: {row.key}={row.value}")
+                continue
+            if chat_id is None:
+                global_values[name] = value
+            else:
+                chat_values.setdefault(chat_id, {})[name] = value
+
+        self._defaults = replace(ChatSettings(), **global_values)
+        self._snapshot = {
+            chat_id: replace(self._defaults, **values)
+            for chat_id, values in chat_values.items()
+        }
+        logger.info(f"Impostazioni caricate: {len(self._snapshot)} gruppi configurati")
+
+    def get(self, chat_id: int) -> ChatSettings:
+        return self._snapshot.get(chat_id, self._defaults)
+
+    async def set(self, chat_id: int, name: str, value) -> ChatSettings:
+        """Salva un'impostazione del gruppo e invalida il suo snapshot"""
+        if name not in _FIELD_TYPES:
+            raise KeyError(name)
+
+        key = f"{chat_id}:{name}"
+        async with get_async_db_session() as session:
+            setting = await session.get(Settings, key)
+            if setting is None:
+                session.add(Settings(key=key, value=_format(value)))
+            else:
+                setting.value = _format(value)
+
+        self._snapshot.pop(chat_id, None)
+        return await self._reload_chat(chat_id)
+
+    def get_value(self, key: str, default: str = None) -> str:
+        """Valore globale libero dalla tabella settings (letto dallo snapshot)"""
+        return self._values.get(key, default)
+
+    async def set_value(self, key: str, value: str):
+        """Salva un valore globale libero (write-through: snapshot aggiornato subito)"""
+        async with get_async_db_session() as session:
+            setting = await session.get(Settings, key)
+            if setting is None:
+                session.add(Settings(key=key, value=value))
+            else:
+                setting.value = value
+        self._values[key] = value
+
+    async def _reload_chat(self, chat_id: int) -> ChatSettings:
+        prefix = f"{chat_id}:"
+        async with get_async_db_session() as session:
+            rows = (await session.execute(
+                select(Settings).where(Settings.key.startswith(prefix))
+            )).scalars().all()
+
+        values = {}
+        for row in rows:
+            _, name = _split_key(row.key)
+            if name in _FIELD_TYPES:
+                values[name] = _parse(name, row.value)
+
+        settings = replace(self._defaults, **values)
+        self._snapshot[chat_id] = settings
+        return settings
+
+
+settings_store = SettingsStore()
@@ -0,0 +1,162 @@
+# /database/warn_ledger.py
+import logging
+import time
+from datetime import datetime, timezone
+from sqlalchemy import and_, delete, or_, select
+from cache.ttl_lru import TTLCache, MISSING
+from database.db_manager import get_async_db_session, as_utc, Warn
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL = 3600  # secondi tra due pulizie degli avvisi scaduti nel database
+
+
+class _Pending:
+    __slots__ = ("adds", "removes")
+
+    def __init__(self):
+        self.adds = []     # istanti (epoch) da inserire
+        self.removes = []  # istanti (epoch) da cancellare
+
+
+def _to_datetime(stamp: float) -> datetime:
+    return datetime.fromtimestamp(stamp, timezone.utc)
+
+
+class WarnLedger:
+    """
+    Avvisi per (chat_id, user_id) con scadenza: tabella warns + cache in memoria degli avvisi attivi.
+    Le letture passano dalla cache (una query indicizzata solo al primo accesso),
+    le scritture restano in coda e vengono salvate in blocco da flush().
+    """
+
+    def __init__(self, expiry_seconds: float, cache_size: int, cache_ttl: float):
+        self.expiry = expiry_seconds
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)  # (chat_id, user_id) -> [istanti attivi, ordinati]
+        self._pending = {}  # (chat_id, user_id) -> _Pending
+        self._last_purge = time.monotonic()
+
+    async def _active(self, chat_id: int, user_id: int) -> list:
+        key = (chat_id, user_id)
+        stamps = self._cache.get(key)
+        if stamps is MISSING:
+            cutoff = _to_datetime(time.time() - self.expiry)
+            async with get_async_db_session() as session:
+                result = await session.execute(
+                    select(Warn.created_at)
+                    .where(Warn.chat_id == chat_id, Warn.user_id == user_id, Warn.created_at > cutoff)
+                    .order_by(Warn.created_at)
+                )
+                stamps = [as_utc(created_at).timestamp() for created_at in result.scalars()]
+            # Le modifiche non ancora salvate valgono anche se la voce era uscita dalla cache
+            pending = self._pending.get(key)
+            if pending:
+                stamps = sorted([s for s in stamps if s not in pending.removes] + pending.adds)
+            self._cache.set(key, stamps)
+
+        # Scarta gli avvisi scaduti dall'ultima lettura
+        cutoff = time.time() - self.expiry
+        if stamps and stamps[0] <= cutoff:
+            stamps[:] = [s for s in stamps if s > cutoff]
+        return stamps
+
+    def _queue(self, key) -> _Pending:
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _Pending()
+        return pending
+
+    async def count(self, chat_id: int, user_id: int) -> int:
+        return len(await self._active(chat_id, user_id))
+
+    async def add(self, chat_id: int, user_id: int) -> int:
+        """Aggiunge un avviso e restituisce il numero di avvisi attivi"""
+        stamps = await self._active(chat_id, user_id)
+        # Precisione al microsecondo come nel database; istanti distinti per cancellare il singolo avviso
+        now = round(time.time(), 6)
+        if stamps and now <= stamps[-1]:
+            now = round(stamps[-1] + 1e-6, 6)
+        stamps.append(now)
+        self._queue((chat_id, user_id)).adds.append(now)
+        return len(stamps)
+
+    async def remove(self, chat_id: int, user_id: int, amount: int = None) -> int:
+        """Rimuove i `amount` avvisi più vecchi (tutti se None) e restituisce quanti ne ha tolti"""
+        stamps = await self._active(chat_id, user_id)
+        removed = stamps[:len(stamps) if amount is None else amount]
+        if not removed:
+            return 0
+        del stamps[:len(removed)]
+
+        pending = self._queue((chat_id, user_id))
+        for stamp in removed:
+            if stamp in pending.adds:
+                pending.adds.remove(stamp)  # mai salvato: basta non inserirlo
+            else:
+                pending.removes.append(stamp)
+        return len(removed)
+
+    async def clear(self, chat_id: int, user_id: int) -> int:
+        return await self.remove(chat_id, user_id)
+
+    async def flush(self):
+        """Salva in blocco inserimenti e cancellazioni in coda; ogni ora elimina gli avvisi scaduti"""
+        if self._pending:
+            pending, self._pending = self._pending, {}
+            rows = [
+                {"chat_id": chat_id, "user_id": user_id, "created_at": _to_datetime(stamp)}
+                for (chat_id, user_id), ops in pending.items()
+                for stamp in ops.adds
+            ]
+            removals = [
+                and_(Warn.chat_id == chat_id, Warn.user_id == user_id,
+                     Warn.created_at.in_([_to_datetime(stamp) for stamp in ops.removes]))
+                for (chat_id, user_id), ops in pending.items()
+                if ops.removes
+            ]
+            try:
+                async with get_async_db_session() as session:
+                    if removals:
+                        await session.execute(delete(Warn).where(or_(*removals)))
+                    if rows:
+                        await session.execute(Warn.__table__.insert(), rows)
+                logger.debug(f"Avvisi salvati: {len(rows)} nuovi, {len(removals)} utenti con rimozioni")
+            except Exception as e:
+                # Rimette in coda davanti alle modifiche arrivate nel frattempo
+                for key, ops in pending.items():
+                    current = self._pending.get(key)
+                    if current is not None:
+                        ops.adds.extend(current.adds)
+                        ops.removes.extend(current.removes)
+                    self._pending[key] = ops
+                logger.error(f"Errore salvataggio avvisi: {str(e)}")
+                return
+
+        if time.monotonic() - self._last_purge >= PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            cutoff = _to_datetime(time.time() - self.expiry)
+            try:
+                async with get_async_db_session() as session:
+                    result = await session.execute(delete(Warn).where(Warn.created_at <= cutoff))
+                if result.rowcount:
+                    logger.info(f"Avvisi scaduti eliminati: {result.rowcount}")
+            except Exception as e:
+                logger.error(f"Errore pulizia avvisi scaduti: {str(e)}")
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "pending": len(self._pending)}
+
+
+warn_ledger = WarnLedger(
+    expiry_seconds=config.WARN_EXPIRY_DAYS * 86400,
+    cache_size=config.WARN_CACHE_SIZE,
+    cache_ttl=config.WARN_CACHE_TTL,
+)
+
+async def flush_warn_ledger(context=None):
+    """Job periodico di salvataggio degli avvisi"""
+    await warn_ledger.flush()
@@ -0,0 +1,102 @@
+# /deletions.py
+import heapq
+import logging
+import time
+from datetime import datetime, timezone
+from sqlalchemy import delete, select
+from telegram.constants import BulkRequestLimit
+from telegram.ext import ContextTypes
+from database.db_manager import get_async_db_session, dialect_insert, as_utc, PendingDeletion
+
+logger = logging.getLogger(__name__)
+
+
+class DeletionScheduler:
+    """
+    Cancellazioni programmate dei messaggi del bot.
+    schedule() ritorna subito: le scadenze stanno in un min-heap controllato da un job periodico,
+    che cancella in blocco (delete_messages) i messaggi scaduti della stessa chat.
+    Le voci sono salvate nella tabella pending_deletions e ricaricate all'avvio.
+    """
+
+    def __init__(self):
+        self._heap = []      # (scadenza epoch, chat_id, message_id)
+        self._unsaved = []   # voci non ancora scritte nel database
+
+    def schedule(self, chat_id: int, message_id: int, delay: float):
+        """Cancella il messaggio tra `delay` secondi; delay None = messaggio permanente"""
+        if delay is None:
+            return
+        entry = (time.time() + delay, chat_id, message_id)
+        heapq.heappush(self._heap, entry)
+        self._unsaved.append(entry)
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def load(self):
+        """Ricarica le cancellazioni rimaste in sospeso (da chiamare all'avvio)"""
+        async with get_async_db_session() as session:
+            rows = (await session.execute(select(PendingDeletion))).scalars().all()
+        for row in rows:
+            heapq.heappush(self._heap, (as_utc(row.delete_at).timestamp(), row.chat_id, row.message_id))
+        if rows:
+            logger.info(f"Cancellazioni in sospeso ripristinate: {len(rows)}")
+
+    async def flush(self):
+        """Scrive in blocco le nuove voci"""
+        if not self._unsaved:
+            return
+        pending, self._unsaved = self._unsaved, []
+        rows = [
+            {
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "delete_at": datetime.fromtimestamp(due, timezone.utc),
+            }
+            for due, chat_id, message_id in pending
+        ]
+        stmt = dialect_insert(PendingDeletion).values(rows).on_conflict_do_nothing()
+        try:
+            async with get_async_db_session() as session:
+                await session.execute(stmt)
+        except Exception as e:
+            self._unsaved.extend(pending)
+            logger.error(f"Errore salvataggio cancellazioni programmate: {str(e)}")
+
+    async def run_due(self, bot):
+        """Cancella i messaggi scaduti, raggruppati per chat"""
+        await self.flush()
+
+        now = time.time()
+        heap = self._heap
+        due = {}
+        while heap and heap[0][0] <= now:
+            _, chat_id, message_id = heapq.heappop(heap)
+            due.setdefault(chat_id, []).append(message_id)
+        if not due:
+            return
+
+        step = BulkRequestLimit.MAX_LIMIT
+        for chat_id, message_ids in due.items():
+            for start in range(0, len(message_ids), step):
+                try:
+                    await bot.delete_messages(chat_id=chat_id, message_ids=message_ids[start:start + step])
+                except Exception as e:
+                    # Messaggi già cancellati o troppo vecchi: non si riprova
+                    logger.debug(f"Cancellazione messaggi in {chat_id} fallita: {str(e)}")
+
+        try:
+            async with get_async_db_session() as session:
+                await session.execute(
+                    delete(PendingDeletion).where(PendingDeletion.delete_at <= datetime.fromtimestamp(now, timezone.utc))
+                )
+        except Exception as e:
+            logger.error(f"Errore pulizia cancellazioni programmate: {str(e)}")
+
+
+deletion_scheduler = DeletionScheduler()
+
+async def process_deletions(context: ContextTypes.DEFAULT_TYPE):
+    """Job periodico: esegue le cancellazioni scadute"""
+    await deletion_scheduler.run_due(context.bot)
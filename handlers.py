@@ -1,13 +1,23 @@
 #handlers.py
-from telegram.ext import CommandHandler, MessageHandler, filters
+from telegram import Update
+from telegram.ext import CommandHandler, MessageHandler, ChatMemberHandler, ChatBoostHandler, TypeHandler, filters
 from commands.mute_unmute import mute_command, unmute_command
 from commands.warn_ban import warn_command, ban_command, unwarn_command
 from commands.on_off_premium import premium_on_command, premium_off_command, premium_status_command
 from commands.on_off_media import immune_command, immune_list_command
-from utils import welcome_command, handle_system_message
-from antiflood.mediasystem import on_media_message
+from commands.limits import limits_command
+from commands.profile import profile_command
+from commands.bulk import bulk_ban_command, bulk_warn_command, bulk_mute_command, bulk_unmute_command
+from utils import welcome_command
+from pipeline import process_message
 from callbacks.hasBoosted import unmute_callback_handler
-from callbacks.premium_block import check_premium_message
+from callbacks.chat_boost import track_chat_boost
+from cache.admin_roster import track_chat_member
+from cache.user_directory import observe_update
+from metrics import instrument_handlers
+from recorder import record_update
+from profiler import profiler
+from config import config
 import logging
 
 # Configure the logger
@@ -18,22 +28,26 @@ logging.basicConfig(level=logging.INFO)
 
 # Modifica l'ordine degli handler per evitare conflitti
 def setup_handlers(app):
+    # ⬛ Registrazione del traffico per il replay (solo con RECORD_UPDATES_PATH)
+    if config.RECORD_UPDATES_PATH:
+        app.add_handler(TypeHandler(Update, record_update), group=-2)
+
+    # ⬜ Directory utenti: osserva ogni update prima di tutti gli altri gruppi
+    app.add_handler(TypeHandler(Update, observe_update), group=-1)
+
     # 🟪 Callback inline (prima dei message handler)
     app.add_handler(unmute_callback_handler)
-    
-    # 🟦 Messaggi di sistema (es. potenziamenti)
-    system_message_filter = filters.StatusUpdate.ALL
-    logger.info("Registrazione dell'handler per i messaggi di sistema.")
-    app.add_handler(MessageHandler(system_message_filter, handle_system_message), group=1)
-    
-    # 🟩 Premium check (intercetta tutti i messaggi tranne i comandi)
-    premium_filter = filters.ALL & ~filters.StatusUpdate.ALL & ~filters.COMMAND
-    app.add_handler(MessageHandler(premium_filter, check_premium_message), group=0)
 
-    # Handler per i media (viene eseguito solo se il premium_block non blocca)
-    media_filter = filters.PHOTO | filters.VIDEO | filters.ANIMATION | filters.Sticker.ALL
-    app.add_handler(MessageHandler(media_filter, on_media_message), group=2)
+    # 🟫 Promozioni/retrocessioni: tengono aggiornato il roster admin in cache
+    app.add_handler(ChatMemberHandler(track_chat_member, ChatMemberHandler.ANY_CHAT_MEMBER))
+
+    # 🟧 Boost aggiunti/rimossi: indice locale dei boost e smute automatico
+    app.add_handler(ChatBoostHandler(track_chat_boost, ChatBoostHandler.ANY_CHAT_BOOST))
     
+    # 🟩 Pipeline messaggi: messaggi di sistema, controllo premium e antiflood in un solo passaggio
+    # (tutti i messaggi tranne i comandi, dopo il benvenuto del gruppo 0)
+    app.add_handler(MessageHandler(filters.UpdateType.MESSAGE & ~filters.COMMAND, process_message), group=1)
+
     # 🟦 Messaggi di benvenuto (primo in assoluto)
     app.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, welcome_command))
         
@@ -43,9 +57,22 @@ def setup_handlers(app):
     app.add_handler(CommandHandler("rwarn", warn_command))
     app.add_handler(CommandHandler("runwarn", unwarn_command))
     app.add_handler(CommandHandler("rban", ban_command))
+    app.add_handler(CommandHandler("rban_multi", bulk_ban_command))
+    app.add_handler(CommandHandler("rwarn_multi", bulk_warn_command))
+    app.add_handler(CommandHandler("blocca_multi", bulk_mute_command))
+    app.add_handler(CommandHandler("libera_multi", bulk_unmute_command))
     app.add_handler(CommandHandler("premiumOn", premium_on_command))
     app.add_handler(CommandHandler("premiumOff", premium_off_command))
     app.add_handler(CommandHandler("premiumStatus", premium_status_command))
     app.add_handler(CommandHandler("immune", immune_command))
     app.add_handler(CommandHandler("immune_list", immune_list_command))
+    app.add_handler(CommandHandler("limiti", limits_command))
+    app.add_handler(CommandHandler("profile", profile_command))
+
+    # 📊 Durata ed errori di ogni handler (metriche su /metrics)
+    instrument_handlers(app)
+
+    # 🔬 Profilazione a campionamento per handler e chat (solo con PROFILE_ENABLED)
+    if config.PROFILE_ENABLED:
+        profiler.instrument(app)
 
@@ -0,0 +1,243 @@
+# /metrics.py
+"""
+Metriche interne in formato testo Prometheus (nessuna dipendenza esterna).
+
+Contatori e istogrammi vivono in memoria con etichette posizionali (tuple di stringhe);
+il server HTTP minimale risponde a GET /metrics su METRICS_LISTEN:METRICS_PORT.
+Le misure sono pensate per il percorso caldo: un lookup in dizionario e qualche somma.
+"""
+import asyncio
+import bisect
+import functools
+import logging
+import time
+from telegram.ext import ApplicationHandlerStop
+from cache.expiring import expiring_maps
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Secondi: dalle decisioni in memoria (sotto il ms) alle chiamate API lente
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tutte le metriche registrate, nell'ordine di creazione
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = None) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contatore monotono per combinazione di etichette"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self, out: list):
+        out.append(f"# HELP {self.name} {self.documentation}")
+        out.append(f"# TYPE {self.name} counter")
+        for labels, value in self._values.items():
+            out.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+
+
+class Gauge:
+    """Valore istantaneo letto da una funzione al momento dell'esportazione"""
+
+    def __init__(self, name: str, documentation: str, read, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # read() -> numero, oppure {tuple di etichette: numero} se ci sono etichette
+        self._read = read
+        _registry.append(self)
+
+    def render(self, out: list):
+        try:
+            values = self._read()
+        except Exception as e:
+            logger.warning(f"Lettura della metrica {self.name} fallita: {str(e)}")
+            return
+        if not self.labelnames:
+            values = {(): values}
+        out.append(f"# HELP {self.name} {self.documentation}")
+        out.append(f"# TYPE {self.name} gauge")
+        for labels, value in values.items():
+            out.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+
+
+class _Series:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Istogramma a bucket fissi per combinazione di etichette (conteggi non cumulativi in memoria)"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _Series(len(self.buckets) + 1)
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series.count if series else 0
+
+    def render(self, out: list):
+        out.append(f"# HELP {self.name} {self.documentation}")
+        out.append(f"# TYPE {self.name} histogram")
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series.total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series.count}")
+
+
+def render() -> str:
+    out = []
+    for metric in _registry:
+        metric.render(out)
+    return "\n".join(out) + "\n"
+
+
+# Metriche del bot (le misure stanno nei moduli interessati)
+handler_seconds = Histogram("bot_handler_seconds", "Durata degli handler registrati", ("handler",))
+handler_errors = Counter("bot_handler_errors_total", "Eccezioni sollevate dagli handler", ("handler",))
+api_request_seconds = Histogram("bot_api_request_seconds", "Durata delle chiamate alla Bot API (singolo tentativo)", ("method",))
+api_retry_after = Counter("bot_api_retry_after_total", "Risposte 429 (RetryAfter) della Bot API", ("method",))
+api_errors = Counter("bot_api_errors_total", "Chiamate alla Bot API terminate con errore", ("method",))
+db_query_seconds = Histogram("bot_db_query_seconds", "Durata delle query SQL", ("statement",))
+db_pool_checkout_seconds = Histogram("bot_db_pool_checkout_seconds", "Attesa per ottenere una connessione dal pool")
+antiflood_decisions = Counter("bot_antiflood_decisions_total", "Decisioni dell'antiflood sui media", ("decision",))
+Gauge(
+    "bot_expiring_map_entries", "Voci nelle mappe con scadenza (stato antiflood, cache)",
+    lambda: {(name,): len(mapping) for name, mapping in expiring_maps().items()}, ("map",)
+)
+
+
+def instrument_handlers(app):
+    """Avvolge la callback di ogni handler registrato con la misura di durata ed errori"""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            handler.callback = _timed(handler.callback)
+
+def _timed(callback):
+    name = getattr(callback, "__qualname__", None) or type(callback).__name__
+    if getattr(callback, "_metrics_timed", False):
+        return callback
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, name)
+
+    wrapper._metrics_timed = True
+    return wrapper
+
+
+class MetricsServer:
+    """Server HTTP minimale: GET /metrics, una richiesta per connessione"""
+
+    def __init__(self):
+        self._server = None
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info(f"Metriche esposte su http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                return
+            method, _, rest = head.decode("latin-1").partition(" ")
+            path = rest.split(" ", 1)[0].split("?", 1)[0]
+
+            if method != "GET":
+                status, body = "405 Method Not Allowed", b""
+            elif path != "/metrics":
+                status, body = "404 Not Found", b""
+            else:
+                status, body = "200 OK", render().encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+metrics_server = MetricsServer()
+
+async def start_metrics_server():
+    """Avvia l'endpoint delle metriche se METRICS_PORT è configurata (0 = disattivato)"""
+    if not config.METRICS_PORT:
+        return
+    try:
+        await metrics_server.start(config.METRICS_LISTEN, config.METRICS_PORT)
+    except OSError as e:
+        logger.error(f"Avvio server metriche fallito: {str(e)}")
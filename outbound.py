@@ -0,0 +1,196 @@
+# /outbound.py
+"""
+Scheduler delle chiamate in uscita verso la Bot API.
+
+Tutte le richieste del bot passano da OutboundScheduler (rate limiter dell'Application):
+- un token bucket globale (OUTBOUND_GLOBAL_RATE richieste al secondo) servito per priorità,
+  con le azioni di moderazione davanti alle risposte "cosmetiche";
+- un token bucket per chat sui soli invii/modifiche di messaggi (limiti di Telegram per gruppo e per privato);
+- su RetryAfter la chat (o tutto il bot) resta ferma per il tempo indicato e la richiesta viene ripetuta.
+Per non tenere fermo l'handler, le chiamate di cui non serve il risultato vanno passate a submit().
+"""
+import asyncio
+import heapq
+import logging
+import random
+import time
+from datetime import timedelta
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from antiflood.ratelimit import BucketState, TokenBucket, now_ms
+from cache.expiring import ExpiringDict
+from metrics import Gauge, api_request_seconds, api_retry_after, api_errors
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Priorità (valore più basso = servita prima)
+PRIORITY_MODERATION = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_COSMETIC = 2
+
+MODERATION_ENDPOINTS = frozenset({
+    "banChatMember", "unbanChatMember", "restrictChatMember",
+    "deleteMessage", "deleteMessages", "banChatSenderChat",
+})
+# Endpoint soggetti ai limiti di invio per chat
+_SEND_PREFIXES = ("send", "edit", "copy", "forward")
+
+
+def endpoint_priority(endpoint: str) -> int:
+    if endpoint in MODERATION_ENDPOINTS:
+        return PRIORITY_MODERATION
+    if endpoint.startswith(_SEND_PREFIXES):
+        return PRIORITY_COSMETIC
+    return PRIORITY_DEFAULT
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class PriorityGate:
+    """
+    Token bucket condiviso con coda di attesa per priorità: chi trova un gettone e nessuno in coda
+    passa subito, gli altri vengono serviti in ordine (priorità, arrivo) da un unico task.
+    """
+
+    def __init__(self, policy: TokenBucket):
+        self.policy = policy
+        self.state = BucketState()
+        self.blocked_until = 0  # ms (now_ms): fermo imposto da un RetryAfter
+        self._waiters = []      # (priorità, progressivo, future)
+        self._seq = 0
+        self._pump = None
+
+    async def acquire(self, priority: int):
+        now = now_ms()
+        if not self._waiters and now >= self.blocked_until and self.policy.allow(self.state, now):
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, self._seq, future))
+        self._seq += 1
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        await future
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, now_ms() + int(seconds * 1000))
+
+    async def _run(self):
+        waiters = self._waiters
+        while waiters:
+            if waiters[0][2].done():
+                heapq.heappop(waiters)  # chiamata annullata mentre aspettava
+                continue
+            now = now_ms()
+            wait = self.blocked_until - now
+            if wait <= 0:
+                if self.policy.allow(self.state, now):
+                    heapq.heappop(waiters)[2].set_result(None)
+                    continue
+                wait = self.policy.retry_after_ms(self.state, now)
+            await asyncio.sleep(wait / 1000)
+
+    def __len__(self):
+        return len(self._waiters)
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """Rate limiter dell'Application: limiti globali e per chat, priorità e ripetizione su RetryAfter"""
+
+    def __init__(self, global_rate: int, group_per_minute: int, max_retries: int):
+        self.max_retries = max_retries
+        self.group_per_minute = group_per_minute
+        self._global = PriorityGate(TokenBucket(capacity=global_rate, refill_seconds=1 / global_rate))
+        # Cancelli per chat inutilizzati da 10 minuti vengono scartati
+        self._chats = ExpiringDict(ttl=600, name="outbound_chats")
+        self.retries = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_gate(self, chat_id) -> PriorityGate:
+        gate = self._chats.touch_get(chat_id)
+        if gate is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                policy = TokenBucket(capacity=1, refill_seconds=1)   # chat privata: ~1 messaggio al secondo
+            else:
+                policy = TokenBucket(capacity=self.group_per_minute, refill_seconds=60 / self.group_per_minute)
+            gate = PriorityGate(policy)
+            self._chats.set(chat_id, gate)
+        return gate
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = endpoint_priority(endpoint)
+        if isinstance(rate_limit_args, dict):
+            priority = rate_limit_args.get("priority", priority)
+
+        chat_id = data.get("chat_id")
+        chat_gate = self._chat_gate(chat_id) if chat_id is not None and endpoint.startswith(_SEND_PREFIXES) else None
+
+        for attempt in range(self.max_retries + 1):
+            if chat_gate is not None:
+                await chat_gate.acquire(priority)
+            await self._global.acquire(priority)
+            started = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                api_retry_after.inc(endpoint)
+                if attempt == self.max_retries:
+                    api_errors.inc(endpoint)
+                    raise
+                # Backoff: il tempo indicato da Telegram più un piccolo margine crescente
+                delay = _retry_seconds(e) + random.uniform(0, 0.5) * (attempt + 1)
+                # Fermo solo la chat interessata se la richiesta è un invio, altrimenti tutto il bot
+                (chat_gate or self._global).block(delay)
+                self.retries += 1
+                logger.warning(f"RetryAfter su {endpoint} (chat {chat_id}): nuovo tentativo tra {delay:.1f}s")
+            except Exception:
+                api_errors.inc(endpoint)
+                raise
+            finally:
+                api_request_seconds.observe(time.perf_counter() - started, endpoint)
+
+    def stats(self) -> dict:
+        return {"queued": len(self._global), "chats": len(self._chats), "retries": self.retries}
+
+
+outbound_scheduler = OutboundScheduler(
+    global_rate=config.OUTBOUND_GLOBAL_RATE,
+    group_per_minute=config.OUTBOUND_GROUP_PER_MINUTE,
+    max_retries=config.OUTBOUND_MAX_RETRIES,
+)
+
+Gauge("bot_api_queued_requests", "Chiamate in attesa del limite globale", lambda: len(outbound_scheduler._global))
+
+# Task in background lanciati con submit() (riferimenti forti fino al termine)
+_background = set()
+
+def _finished(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Chiamata API in background fallita ({task.get_name()}): {task.exception()}")
+
+def submit(coroutine, label: str = "api") -> asyncio.Task:
+    """Esegue una chiamata API senza attenderla: l'handler prosegue subito"""
+    task = asyncio.create_task(coroutine, name=label)
+    _background.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+async def drain_background():
+    """Attende la fine delle chiamate lanciate con submit()"""
+    while _background:
+        await asyncio.gather(*list(_background), return_exceptions=True)
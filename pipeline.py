@@ -0,0 +1,65 @@
+# /pipeline.py
+"""
+Pipeline unica per i messaggi dei gruppi.
+
+Un solo handler classifica l'update una volta, costruisce un MessageContext condiviso
+e applica in ordine le regole (premium, poi antiflood). Impostazioni e tipo di media
+vengono letti una volta sola; lo stato admin è caricato solo se una regola lo chiede
+e poi riusato dalle successive.
+"""
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes, filters
+from database.settings_store import settings_store
+from cache.admin_roster import admin_roster
+from antiflood.mediasystem import flood_rule, media_kind
+from callbacks.premium_block import premium_rule
+from utils import handle_system_message
+
+logger = logging.getLogger(__name__)
+
+GROUP_TYPES = ("group", "supergroup")
+
+
+class MessageContext:
+    """Dati di un messaggio calcolati una volta e condivisi tra le regole"""
+    __slots__ = ("message", "chat", "user", "kind", "settings", "_admin")
+
+    def __init__(self, message, chat, user):
+        self.message = message
+        self.chat = chat
+        self.user = user
+        self.kind = media_kind(message)
+        self.settings = settings_store.get(chat.id)
+        self._admin = None
+
+    async def is_admin(self, bot) -> bool:
+        """Stato admin/owner dal roster in cache, al massimo un lookup per messaggio"""
+        if self._admin is None:
+            self._admin = await admin_roster.is_admin(bot, self.chat.id, self.user.id)
+        return self._admin
+
+
+async def process_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Solo messaggi nuovi: modifiche, post di canale e simili non passano dalle regole
+    message = update.message
+    if message is None:
+        return
+
+    # Messaggi di sistema: solo log/ringraziamenti, nessuna regola di moderazione
+    if filters.StatusUpdate.ALL.check_update(update):
+        await handle_system_message(update, context)
+        return
+
+    chat = message.chat
+    user = message.from_user
+    if chat.type not in GROUP_TYPES or user is None:
+        return
+
+    message_ctx = MessageContext(message, chat, user)
+
+    # Il controllo premium può mutare l'utente: in quel caso il media non conta per l'antiflood
+    muted = await premium_rule(message_ctx, context)
+    if muted or message_ctx.kind is None:
+        return
+    await flood_rule(message_ctx, context)
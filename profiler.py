@@ -0,0 +1,152 @@
+# /profiler.py
+"""
+Profilazione a campionamento degli handler, attivabile senza una build di debug.
+
+Con PROFILE_ENABLED ogni handler registrato viene avvolto da una funzione che associa il proprio
+frame al tag (nome dell'handler, chat). Un thread separato legge ogni PROFILE_SAMPLE_MS ms lo stack
+del thread dell'event loop; se dentro lo stack c'è un handler avvolto, il campione viene contato
+sotto il suo tag. Ogni PROFILE_DUMP_INTERVAL secondi i conteggi vengono scritti in PROFILE_DIR
+in formato "folded" (flamegraph.pl, speedscope), con handler e chat come primi livelli dello stack.
+
+I campioni misurano il tempo di CPU sull'event loop: le attese (API, DB) non compaiono qui
+ma nella durata degli handler esposta da metrics.py.
+"""
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from telegram import Update
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPTH = 128
+
+
+class SamplingProfiler:
+    def __init__(self, directory: str, sample_interval: float, dump_interval: float):
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.dump_interval = dump_interval
+        self._tags = {}          # frame dell'handler avvolto -> (handler, chat_id)
+        self._samples = Counter()  # (handler, chat_id, stack) -> campioni
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._target = None      # ident del thread dell'event loop
+        self.outside = 0         # campioni con il loop fuori dagli handler (idle, job, flush)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def instrument(self, app):
+        """Avvolge la callback di ogni handler registrato"""
+        for handlers in app.handlers.values():
+            for handler in handlers:
+                handler.callback = self.wrap(handler.callback)
+
+    def wrap(self, callback):
+        name = getattr(callback, "__qualname__", None) or type(callback).__name__
+        tags = self._tags
+
+        @functools.wraps(callback)
+        async def profiled(update, context):
+            chat = update.effective_chat if isinstance(update, Update) else None
+            # Il frame di una coroutine resta lo stesso tra una sospensione e l'altra
+            frame = sys._getframe()
+            tags[frame] = (name, chat.id if chat else None)
+            try:
+                return await callback(update, context)
+            finally:
+                tags.pop(frame, None)
+
+        return profiled
+
+    def start(self, target: int = None):
+        """Avvia il campionamento del thread `target` (default: il thread chiamante, cioè l'event loop)"""
+        if self.running:
+            return
+        self._target = target if target is not None else threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Profilazione avviata: un campione ogni {self.sample_interval * 1000:.0f} ms, dump in {self.directory}")
+
+    def stop(self) -> str:
+        """Ferma il campionamento e scrive gli ultimi campioni; restituisce il file scritto (o None)"""
+        if not self.running:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        logger.info("Profilazione fermata")
+        return self.dump()
+
+    def _run(self):
+        next_dump = time.monotonic() + self.dump_interval
+        while not self._stop.wait(self.sample_interval):
+            self._sample()
+            if time.monotonic() >= next_dump:
+                next_dump = time.monotonic() + self.dump_interval
+                try:
+                    self.dump()
+                except OSError as e:
+                    logger.error(f"Errore scrittura profilo: {str(e)}")
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._target)
+        stack = []
+        tag = None
+        tags = self._tags
+        while frame is not None and len(stack) < MAX_DEPTH:
+            tag = tags.get(frame)
+            if tag is not None:
+                break
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}")
+            frame = frame.f_back
+        if tag is None:
+            self.outside += 1
+            return
+        stack.reverse()
+        with self._lock:
+            self._samples[(tag[0], tag[1], tuple(stack))] += 1
+
+    def snapshot(self) -> Counter:
+        """Campioni per handler dall'ultimo dump"""
+        per_handler = Counter()
+        with self._lock:
+            for (handler, _, _), count in self._samples.items():
+                per_handler[handler] += count
+        return per_handler
+
+    def dump(self) -> str:
+        """Scrive i campioni dall'ultimo dump in un file .folded e li azzera"""
+        with self._lock:
+            samples, self._samples = self._samples, Counter()
+        if not samples:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+        with open(path, "a", encoding="utf-8") as f:
+            for (handler, chat_id, stack), count in samples.most_common():
+                f.write(";".join((handler, f"chat {chat_id}", *stack)) + f" {count}\n")
+
+        per_handler = Counter()
+        for (handler, _, _), count in samples.items():
+            per_handler[handler] += count
+        summary = ", ".join(f"{handler}={count}" for handler, count in per_handler.most_common(5))
+        logger.info(f"Profilo salvato in {path}: {sum(samples.values())} campioni ({summary})")
+        return path
+
+
+profiler = SamplingProfiler(
+    directory=config.PROFILE_DIR,
+    sample_interval=config.PROFILE_SAMPLE_MS / 1000,
+    dump_interval=config.PROFILE_DUMP_INTERVAL,
+)
@@ -0,0 +1,151 @@
+# /recorder.py
+"""
+Registrazione del traffico in ingresso per il replay (vedi benchmarks/replay.py).
+
+Con RECORD_UPDATES_PATH impostato ogni update viene anonimizzato e accodato in memoria;
+un job lo scrive in blocco sul file JSONL, una riga per update:
+    {"t": secondi dall'inizio della registrazione, "update": {...}}
+Anonimizzazione: ID di utenti e chat (anche *chat_id / *user_id) sostituiti da pseudonimi stabili
+(hash con sale), nomi e username rimossi, testi, titoli, indirizzi e sondaggi mascherati tranne
+i comandi, coordinate azzerate, file_id sostituiti; nei payload dei pulsanti l'ID utente diventa
+lo stesso pseudonimo, quelli non riconosciuti sono mascherati.
+Forma del traffico (tempi, chat, autori, tipi di media, premium, ingressi) resta intatta.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+from telegram import Update
+from telegram.ext import ContextTypes
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Campi con dati personali o contenuti: rimossi
+_DROPPED = frozenset({
+    "first_name", "last_name", "username", "bio", "description",
+    "phone_number", "language_code", "invite_link", "active_usernames",
+    "foursquare_id", "foursquare_type", "google_place_id", "google_place_type",
+})
+# Testi mascherati (stessa lunghezza), con il campo delle relative entità
+_MASKED = {
+    "text": ("entities", "text_entities"),
+    "caption": ("caption_entities",),
+    "question": ("question_entities",),
+    "explanation": ("explanation_entities",),
+    "address": (),
+    "title": (),
+}
+# Coordinate di posizioni, luoghi e posizioni live: azzerate
+_COORDINATES = frozenset({"latitude", "longitude"})
+_ID_SUFFIXES = ("chat_id", "user_id")
+_FILE_KEYS = frozenset({"file_id", "file_unique_id"})
+# Payload dei pulsanti (callback_query.data e callback_data della tastiera)
+_CALLBACK_KEYS = frozenset({"data", "callback_data"})
+# Payload noti con un ID utente: l'ID diventa lo stesso pseudonimo di from.id, il resto è mascherato
+_CALLBACK_USER = re.compile(r"^(unmute_me_v2:)(\d+)$")
+
+
+class TrafficRecorder:
+    def __init__(self, path: str, salt: str):
+        self.path = path
+        # blake2b accetta chiavi fino a 64 byte: il sale configurato viene ridotto a 32
+        self._salt = hashlib.sha256(salt.encode()).digest()
+        self._started = None
+        self._pending = []
+        self.recorded = 0
+
+    def pseudonym(self, value: int) -> int:
+        """Stesso ID -> stesso pseudonimo per tutta la registrazione; il segno (privato/gruppo) resta"""
+        digest = hashlib.blake2b(str(abs(value)).encode(), key=self._salt, digest_size=8).digest()
+        magnitude = int.from_bytes(digest, "big") % 10 ** 12
+        return -(10 ** 12 + magnitude) if value < 0 else magnitude + 1
+
+    def _mask(self, text: str, entities) -> str:
+        """
+        Testo sostituito da puntini, comandi (/nome) lasciati in chiaro. Si lavora in unità UTF-16
+        come gli offset delle entità di Telegram, così le entità restano valide.
+        """
+        units = text.encode("utf-16-le")
+        masked = bytearray("·".encode("utf-16-le") * (len(units) // 2))
+        for entity in entities or ():
+            if entity.get("type") == "bot_command":
+                start, end = entity["offset"] * 2, (entity["offset"] + entity["length"]) * 2
+                masked[start:end] = units[start:end]
+        return masked.decode("utf-16-le")
+
+    def _callback_payload(self, payload: str) -> str:
+        match = _CALLBACK_USER.match(payload)
+        if match is None:
+            return self._mask(payload, None)
+        return f"{match.group(1)}{self.pseudonym(int(match.group(2)))}"
+
+    def _sanitize(self, value):
+        if isinstance(value, list):
+            return [self._sanitize(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        # Utenti (is_bot) e chat (type): l'ID diventa uno pseudonimo
+        is_entity = "is_bot" in value or ("type" in value and "id" in value and isinstance(value["id"], int))
+        out = {}
+        for key, item in value.items():
+            if key in _DROPPED:
+                continue
+            if key == "title" and is_entity:
+                out[key] = f"Gruppo {self.pseudonym(value['id'])}"
+            elif key in _MASKED and isinstance(item, str):
+                entities = next((value[name] for name in _MASKED[key] if name in value), None)
+                out[key] = self._mask(item, entities)
+            elif key in _CALLBACK_KEYS and isinstance(item, str):
+                out[key] = self._callback_payload(item)
+            elif key in _COORDINATES:
+                out[key] = 0.0
+            elif key in _FILE_KEYS:
+                out[key] = hashlib.blake2b(str(item).encode(), key=self._salt, digest_size=8).hexdigest()
+            elif isinstance(item, int) and not isinstance(item, bool) and (key.endswith(_ID_SUFFIXES) or (key == "id" and is_entity)):
+                out[key] = self.pseudonym(item)
+            elif key.endswith("entities") and isinstance(item, list):
+                # Le entità con utente (text_mention) passano dal ramo generico, url e link testuali no
+                out[key] = [self._sanitize({k: v for k, v in entity.items() if k != "url"}) for entity in item]
+            else:
+                out[key] = self._sanitize(item)
+        if "first_name" in value:
+            out["first_name"] = f"Utente{out.get('id', '')}"
+        return out
+
+    def record(self, update: Update):
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now
+        self._pending.append({"t": round(now - self._started, 3), "update": self._sanitize(update.to_dict())})
+
+    def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in pending))
+        self.recorded += len(pending)
+        return len(pending)
+
+
+traffic_recorder = TrafficRecorder(config.RECORD_UPDATES_PATH, config.RECORD_SALT)
+
+async def record_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler (gruppo -2): accoda l'update anonimizzato, nessun I/O sul percorso dei messaggi"""
+    try:
+        traffic_recorder.record(update)
+    except Exception as e:
+        logger.warning(f"Registrazione update {update.update_id} fallita: {str(e)}")
+
+async def flush_traffic_recording(context=None):
+    """Job periodico: scrive in blocco gli update registrati"""
+    try:
+        traffic_recorder.flush()
+    except OSError as e:
+        logger.error(f"Errore scrittura registrazione traffico: {str(e)}")
@@ -0,0 +1,189 @@
+# /snapshot.py
+import logging
+import struct
+import time
+from sqlalchemy import delete, select
+from antiflood import mediasystem
+from antiflood.ratelimit import BucketState, now_ms
+from antiflood.record import FloodRecord, flood_key, split_flood_key
+from database.db_manager import get_async_db_session, StateSnapshotBlock
+
+logger = logging.getLogger(__name__)
+
+# Formato binario: intestazione, poi una sequenza di voci "tag + dati".
+# Salvato nel database (tabella state_snapshots, il filesystem del deploy non è persistente):
+# il primo blocco contiene tutto lo stato, i successivi (journal, stesso formato) solo le voci
+# cambiate dall'ultimo salvataggio, applicate in ordine sopra la base al caricamento.
+MAGIC = b"RSBSNAP2"
+# chat_id, user_id, ingresso, ultimo media (ms epoch, -1 = nessuno), gettoni, finestra precedente,
+# avvisato, scadenza (ms epoch), numero di budget per tipo di media che seguono
+FLOOD = struct.Struct("<qqqqdqBqB")
+# Budget per tipo di media: lunghezza del nome (seguito dal nome), poi gettoni, istante (ms epoch), finestra precedente
+KIND_NAME = struct.Struct("<B")
+KIND_STATE = struct.Struct("<dqq")
+
+TAG_FLOOD = b"F"
+
+
+class _Clock:
+    """Conversione tra ms monotoni (stato in memoria) e ms epoch (file), calcolata una volta per passaggio"""
+
+    def __init__(self):
+        self.offset = int(time.time() * 1000) - now_ms()
+
+    def to_wall(self, mono: int) -> int:
+        return mono + self.offset if mono >= 0 else -1
+
+    def to_mono(self, wall: int) -> int:
+        return wall - self.offset if wall >= 0 else -1
+
+
+def _encode_flood(out: list, key: int, record: FloodRecord, clock: _Clock, now: float):
+    chat_id, user_id = split_flood_key(key)
+    expires_at = int((time.time() + max(record.deadline - now, 0.0)) * 1000)
+    kinds = record.kinds or {}
+    out.append(TAG_FLOOD)
+    out.append(FLOOD.pack(
+        chat_id, user_id,
+        clock.to_wall(record.joined_at), clock.to_wall(record.stamp),
+        record.tokens, record.prev, record.warned, expires_at, len(kinds)
+    ))
+    for kind, state in kinds.items():
+        name = kind.encode()
+        out.append(KIND_NAME.pack(len(name)))
+        out.append(name)
+        out.append(KIND_STATE.pack(state.tokens, clock.to_wall(state.stamp), state.prev))
+
+def _encode_full():
+    """Tutto lo stato; le voci da salvare ripartono da zero (restituite per rimetterle in coda se il salvataggio fallisce)"""
+    clock = _Clock()
+    now = time.monotonic()
+    keys, mediasystem.dirty_flood_keys = mediasystem.dirty_flood_keys, set()
+    out = [MAGIC]
+    for key, record in mediasystem.flood_records.items():
+        _encode_flood(out, key, record, clock, now)
+    return b"".join(out), keys
+
+def _encode_dirty():
+    clock = _Clock()
+    now = time.monotonic()
+    out = []
+
+    keys, mediasystem.dirty_flood_keys = mediasystem.dirty_flood_keys, set()
+    for key in keys:
+        record = mediasystem.flood_records.get(key)
+        if record is not None:
+            _encode_flood(out, key, record, clock, now)
+
+    return b"".join(out), keys
+
+
+class StateSnapshot:
+    """Snapshot periodico incrementale dello stato di moderazione in RAM (blocco base + journal nel DB)"""
+
+    def __init__(self):
+        self._base_size = 0
+        self._journal_size = 0
+
+    async def save_full(self):
+        data, keys = _encode_full()
+        try:
+            # Base nuova e journal vecchio rimosso nella stessa transazione
+            async with get_async_db_session() as session:
+                await session.execute(delete(StateSnapshotBlock))
+                session.add(StateSnapshotBlock(data=data))
+        except Exception:
+            mediasystem.dirty_flood_keys |= keys
+            raise
+        self._base_size = len(data)
+        self._journal_size = 0
+        logger.debug(f"Snapshot completo salvato ({len(data)} byte)")
+
+    async def save_incremental(self):
+        data, keys = _encode_dirty()
+        if not data:
+            return
+        try:
+            async with get_async_db_session() as session:
+                session.add(StateSnapshotBlock(data=data))
+        except Exception:
+            mediasystem.dirty_flood_keys |= keys
+            raise
+        self._journal_size += len(data)
+        # Compattazione: quando il journal supera la base conviene riscrivere tutto
+        if self._journal_size > max(self._base_size, 1 << 20):
+            await self.save_full()
+
+    async def load(self) -> int:
+        """Ripristina lo stato antiflood (base + journal) in un solo passaggio; restituisce le voci lette"""
+        started = time.perf_counter()
+        async with get_async_db_session() as session:
+            result = await session.execute(select(StateSnapshotBlock.data).order_by(StateSnapshotBlock.seq))
+            blocks = result.scalars().all()
+        if not blocks:
+            return 0
+
+        base, journal = blocks[0], blocks[1:]
+        if not base.startswith(MAGIC):
+            logger.error("Snapshot nel database non valido, ignorato")
+            return 0
+        self._base_size = len(base)
+        self._journal_size = sum(len(block) for block in journal)
+
+        count = self._apply(memoryview(base)[len(MAGIC):])
+        for block in journal:
+            count += self._apply(memoryview(block))
+        logger.info(f"Stato ripristinato: {count} voci in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return count
+
+    def _apply(self, data: memoryview) -> int:
+        clock = _Clock()
+        now_wall = time.time()
+        pos = 0
+        count = 0
+        size = len(data)
+        try:
+            while pos < size:
+                tag = bytes(data[pos:pos + 1])
+                pos += 1
+                if tag == TAG_FLOOD:
+                    chat_id, user_id, joined, stamp, tokens, prev, warned, expires_at, n_kinds = FLOOD.unpack_from(data, pos)
+                    pos += FLOOD.size
+                    record = FloodRecord()
+                    record.joined_at = clock.to_mono(joined)
+                    record.stamp = clock.to_mono(stamp)
+                    record.tokens = tokens
+                    record.prev = prev
+                    record.warned = bool(warned)
+                    if n_kinds:
+                        record.kinds = {}
+                        for _ in range(n_kinds):
+                            (length,) = KIND_NAME.unpack_from(data, pos)
+                            pos += KIND_NAME.size
+                            kind = bytes(data[pos:pos + length]).decode()
+                            pos += length
+                            state = BucketState()
+                            state.tokens, kind_stamp, state.prev = KIND_STATE.unpack_from(data, pos)
+                            pos += KIND_STATE.size
+                            state.stamp = clock.to_mono(kind_stamp)
+                            record.kinds[kind] = state
+                    remaining = expires_at / 1000 - now_wall
+                    if remaining > 0:
+                        mediasystem.flood_records.set(flood_key(chat_id, user_id), record, ttl=remaining)
+                else:
+                    raise ValueError(f"tag sconosciuto {tag!r} alla posizione {pos - 1}")
+                count += 1
+        except (struct.error, ValueError) as e:
+            # Blocco troncato o corrotto: si tiene quanto letto fin qui
+            logger.warning(f"Snapshot troncato o corrotto, caricate {count} voci: {e}")
+        return count
+
+
+state_snapshot = StateSnapshot()
+
+async def save_state_snapshot(context=None):
+    """Job periodico: salva le voci cambiate dall'ultimo snapshot"""
+    try:
+        await state_snapshot.save_incremental()
+    except Exception as e:
+        logger.error(f"Errore salvataggio snapshot: {str(e)}")
@@ -1,11 +1,16 @@
 import logging
 import asyncio
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
 from telegram import Update, InputFile
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
+from telegram.error import BadRequest
 from io import BytesIO
-from antiflood.mediasystem import last_media_time, warned_users, new_users_cooldown
+from antiflood.mediasystem import mark_joined
+from database.settings_store import settings_store
+from cache.user_directory import user_directory
+from cache.expiring import ExpiringDict
+from deletions import deletion_scheduler
 from pyrogram import Client
 from pyrogram.raw.functions.contacts import ResolveUsername
 import sys
@@ -17,27 +22,35 @@ API_ID = config.API_ID
 API_HASH = config.API_HASH
 BOT_TOKEN = config.BOT_TOKEN
 
-# Configura il tuo client Pyrogram
-app = Client("RottenShielBot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+# Configura il tuo client Pyrogram (avviato una sola volta in post_init, vedi start_resolver).
+# Serve solo per risolvere username: gli update li riceve PTB, la sessione MTProto non li scarica
+app = Client("RottenShielBot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN, no_updates=True)
+
+# Limite di risoluzioni MTProto contemporanee
+RESOLVE_CONCURRENCY = 4
+_resolve_semaphore = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+_resolver_lock = asyncio.Lock()
 
 logger = logging.getLogger(__name__)
 
 # Stato globale
 verified_boosters = set()     # utenti premium che hanno boostato
-recently_muted = {}           # user_id → datetime dell’ultimo mute premium
-username_map = {}             # mappa username → user_id
+recently_muted = ExpiringDict(ttl=24 * 3600, name="recently_muted")  # user_id → datetime dell’ultimo mute
 
 # Path dell’immagine di benvenuto
 WELCOME_IMAGE = "image.jpg"
+# Chiave settings con "<impronta> <file_id>" dell'immagine già caricata su Telegram
+WELCOME_PHOTO_KEY = "welcome_photo_file_id"
+_welcome_image_stamp = None
+_welcome_upload_lock = asyncio.Lock()
+_pending_welcomes = {}  # chat_id → nuovi membri in attesa del benvenuto cumulativo
 
 async def send_temp_message(chat_id, bot, text, delay=10):
-    """Invia un messaggio temporaneo che viene cancellato automaticamente dopo `delay` secondi."""
+    """Invia un messaggio temporaneo che viene cancellato automaticamente dopo `delay` secondi (None = mai)."""
     message = await bot.send_message(chat_id=chat_id, text=text)
-    await asyncio.sleep(delay)
-    try:
-        await message.delete()
-    except:
-        pass
+    # Ritorna subito: la cancellazione è affidata allo scheduler
+    deletion_scheduler.schedule(chat_id, message.message_id, delay)
+    return message
 
 async def send_private_or_group_message(issuer_id, chat_id, bot, text, delay=10):
     """
@@ -55,57 +68,190 @@ async def send_private_or_group_message(issuer_id, chat_id, bot, text, delay=10)
         await send_temp_message(chat_id=chat_id, bot=bot, text=text, delay=delay)
         return "group"
     
+def _welcome_fingerprint() -> str:
+    """Impronta dell'immagine (dimensione e data di modifica): se cambia, il file_id salvato non vale più"""
+    global _welcome_image_stamp
+    if _welcome_image_stamp is None:
+        stat = os.stat(WELCOME_IMAGE)
+        _welcome_image_stamp = f"{stat.st_size}-{stat.st_mtime_ns}"
+    return _welcome_image_stamp
+
+def _cached_welcome_photo():
+    raw = settings_store.get_value(WELCOME_PHOTO_KEY)
+    if not raw:
+        return None
+    fingerprint, _, file_id = raw.partition(" ")
+    return file_id if fingerprint == _welcome_fingerprint() else None
+
+async def send_welcome_photo(bot, chat_id: int, caption: str):
+    """
+    Invia l'immagine di benvenuto: il file viene caricato una sola volta,
+    poi si riusa il file_id restituito da Telegram (salvato nella tabella settings).
+    """
+    file_id = _cached_welcome_photo()
+    if file_id:
+        try:
+            return await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption, parse_mode=ParseMode.HTML)
+        except BadRequest as e:
+            logger.warning(f"file_id del benvenuto non valido ({str(e)}), nuovo caricamento dell'immagine")
+
+    async with _welcome_upload_lock:
+        # Nel frattempo un altro invio potrebbe aver già caricato l'immagine
+        cached = _cached_welcome_photo()
+        if cached and cached != file_id:
+            return await bot.send_photo(chat_id=chat_id, photo=cached, caption=caption, parse_mode=ParseMode.HTML)
+
+        with open(WELCOME_IMAGE, "rb") as image:
+            message = await bot.send_photo(
+                chat_id=chat_id,
+                photo=InputFile(image),
+                caption=caption,
+                parse_mode=ParseMode.HTML
+            )
+        await settings_store.set_value(WELCOME_PHOTO_KEY, f"{_welcome_fingerprint()} {message.photo[-1].file_id}")
+        logger.info("Immagine di benvenuto caricata, file_id salvato.")
+        return message
+
+def _welcome_caption(users, settings) -> str:
+    mentions = ", ".join(user.mention_html() for user in users)
+    single = len(users) == 1
+    return (
+        f"👋 {'Benvenuto' if single else 'Benvenuti'} {mentions} su <b>𝙍𝙊𝙏𝙏𝙀𝙉 𝙂𝙍𝘼𝙈</b>\n\n"
+        f"⚠️ Per i <u>primi {settings.new_user_window // 60} minuti</u> non {'potrai' if single else 'potrete'} inviare:\n"
+        "<blockquote>"
+        "• Foto\n"
+        "• Video\n"
+        "• GIF\n"
+        "• Stickers\n"
+        "</blockquote>\n"
+        f"<i>Dopo questo periodo {'avrai' if single else 'avrete'} un limite di 1 media ogni {settings.media_cooldown} secondi.</i>"
+    )
+
+async def _send_welcomes(bot, chat_id: int, users):
+    """Un solo benvenuto per gruppo di ingressi (al massimo WELCOME_MAX_MENTIONS menzioni ciascuno)"""
+    unique = list({user.id: user for user in users}.values())
+    settings = settings_store.get(chat_id)
+    step = max(config.WELCOME_MAX_MENTIONS, 1)
+    for start in range(0, len(unique), step):
+        try:
+            await send_welcome_photo(bot, chat_id, _welcome_caption(unique[start:start + step], settings))
+        except Exception as e:
+            logger.error(f"Errore welcome: {str(e)}")
+
+async def _flush_welcomes(context: ContextTypes.DEFAULT_TYPE):
+    """Job: invia il benvenuto cumulativo ai membri entrati durante l'attesa"""
+    chat_id = context.job.chat_id
+    users = _pending_welcomes.pop(chat_id, None)
+    if users:
+        await _send_welcomes(context.bot, chat_id, users)
+
 async def welcome_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("Esecuzione del comando di benvenuto.")
     new_members = update.message.new_chat_members
     if not new_members:
         return
 
+    chat_id = update.effective_chat.id
     for user in new_members:
+        mark_joined(chat_id, user.id)
+        logger.info(f"Registrato nuovo utente: {user.id}")
+
+    if config.WELCOME_BATCH_DELAY <= 0 or context.job_queue is None:
+        await _send_welcomes(context.bot, chat_id, new_members)
+        return
+
+    # Gli ingressi ravvicinati nello stesso gruppo ricevono un unico benvenuto
+    pending = _pending_welcomes.get(chat_id)
+    if pending is not None:
+        pending.extend(new_members)
+        return
+    _pending_welcomes[chat_id] = list(new_members)
+    context.job_queue.run_once(
+        _flush_welcomes,
+        config.WELCOME_BATCH_DELAY,
+        chat_id=chat_id,
+        name=f"welcome:{chat_id}"
+    )
+
+# ——— Funzione di supporto per /mute e /unmute - /warn e /ban ————————————
+async def start_resolver():
+    """Avvia il client Pyrogram condiviso (chiamata da post_init)"""
+    async with _resolver_lock:
+        if not app.is_connected:
+            await app.start()
+            logger.info("Client Pyrogram avviato.")
+
+async def stop_resolver():
+    """Arresta il client Pyrogram condiviso (chiamata da post_shutdown)"""
+    async with _resolver_lock:
+        if app.is_connected:
+            await app.stop()
+            logger.info("Client Pyrogram arrestato.")
+
+async def _restart_resolver():
+    async with _resolver_lock:
         try:
-            new_users_cooldown[user.id] = datetime.now(timezone.utc)
-            
-            with open(WELCOME_IMAGE, "rb") as image:
-                caption = (
-                    f"👋 Benvenuto {user.mention_html()} su <b>𝙍𝙊𝙏𝙏𝙀𝙉 𝙂𝙍𝘼𝙈</b>\n\n"
-                    "⚠️ Per i <u>primi 30 minuti</u> non potrai inviare:\n"
-                    "<blockquote>"
-                    "• Foto\n"
-                    "• Video\n"
-                    "• GIF\n"
-                    "• Stickers\n"
-                    "</blockquote>\n"
-                    "<i>Dopo questo periodo avrai un limite di 1 media al minuto.</i>"
-                )
-                await context.bot.send_photo(
-                    chat_id=update.effective_chat.id,
-                    photo=InputFile(image),
-                    caption=caption,
-                    parse_mode="HTML"
-                )
-                logger.info(f"Registrato nuovo utente: {user.id}")
+            if app.is_connected:
+                await app.stop()
         except Exception as e:
-            logger.error(f"Errore welcome: {str(e)}")
+            logger.warning(f"Errore arresto client Pyrogram: {str(e)}")
+        await app.start()
+        logger.info("Client Pyrogram riconnesso.")
 
-# ——— Funzione di supporto per /mute e /unmute - /warn e /ban ————————————
 async def resolve_username_to_user_id(username: str):
-    async with app:
-        try:
-            logger.info(f"Risoluzione dello username: {username}")
-            result = await app.invoke(ResolveUsername(username=username))
-            if result.users:
-                logger.info(f"Utente trovato: {result.users[0].id}")
-                return result.users[0].id
-            else:
-                logger.warning(f"Nessun utente trovato per username: {username}")
+    async with _resolve_semaphore:
+        for attempt in range(2):
+            try:
+                if not app.is_connected:
+                    await start_resolver()
+                logger.info(f"Risoluzione dello username: {username}")
+                result = await app.invoke(ResolveUsername(username=username))
+                if result.users:
+                    logger.info(f"Utente trovato: {result.users[0].id}")
+                    return result.users[0].id
+                else:
+                    logger.warning(f"Nessun utente trovato per username: {username}")
+                    return None
+            except (ConnectionError, OSError) as e:
+                # Connessione persa: riavvia il client e riprova una volta
+                logger.warning(f"Connessione Pyrogram persa ({str(e)}), riconnessione...")
+                if attempt == 0:
+                    try:
+                        await _restart_resolver()
+                        continue
+                    except Exception as e:
+                        logger.error(f"Riconnessione Pyrogram fallita: {str(e)}")
                 return None
-        except Exception as e:
-            if "USERNAME_INVALID" in str(e):
-                logger.error(f"Errore: Username '{username}' non valido.")
-            else:
-                logger.error(f"Errore durante la risoluzione dello username: {str(e)}")
+            except Exception as e:
+                if "USERNAME_INVALID" in str(e):
+                    logger.error(f"Errore: Username '{username}' non valido.")
+                else:
+                    logger.error(f"Errore durante la risoluzione dello username: {str(e)}")
+                return None
+
+async def resolve_user_token(bot, token: str):
+    """
+    ID numerico o username (con o senza '@') -> utente, prima dalla directory locale e poi dall'API.
+    Restituisce None se lo username non esiste; solleva l'eccezione di get_chat se l'ID non è raggiungibile.
+    """
+    if token.isdigit():
+        user_id = int(token)
+    else:
+        username = token.lstrip("@")  # Rimuove il simbolo '@' se presente
+        entry = await user_directory.lookup_username(username)
+        if entry:
+            return entry.to_user()
+        user_id = await resolve_username_to_user_id(username)
+        if not user_id:
             return None
 
+    entry = await user_directory.lookup(user_id)
+    if entry:
+        return entry.to_user()
+    user = await bot.get_chat(user_id)
+    user_directory.observe(user)
+    return user
+
 async def resolve_target(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.effective_message
 
@@ -114,34 +260,16 @@ async def resolve_target(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     args = context.args
     if args:
-        if args[0].isdigit():
-            try:
-                user = await context.bot.get_chat(int(args[0]))
-                return user
-            except Exception as e:
-                await send_private_or_group_message(
-                    issuer_id=update.effective_user.id,
-                    chat_id=update.effective_chat.id,
-                    bot=context.bot,
-                    text="Impossibile trovare l'utente da ID."
-                )
-                return None
-        else:
-            # Fallback: risolvi lo username
-            username = args[0].lstrip("@")  # Rimuove il simbolo '@' se presente
-            user_id = await resolve_username_to_user_id(username)
-            if user_id:
-                try:
-                    user = await context.bot.get_chat(user_id)
-                    return user
-                except Exception as e:
-                    await send_private_or_group_message(
-                        issuer_id=update.effective_user.id,
-                        chat_id=update.effective_chat.id,
-                        bot=context.bot,
-                        text="Impossibile trovare l'utente dallo username."
-                    )
-                    return None
+        try:
+            return await resolve_user_token(context.bot, args[0])
+        except Exception as e:
+            await send_private_or_group_message(
+                issuer_id=update.effective_user.id,
+                chat_id=update.effective_chat.id,
+                bot=context.bot,
+                text="Impossibile trovare l'utente da ID." if args[0].isdigit() else "Impossibile trovare l'utente dallo username."
+            )
+            return None
     return None
 
 async def handle_system_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
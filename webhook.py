@@ -0,0 +1,170 @@
+# /webhook.py
+"""
+Ingresso degli update via webhook con un server HTTP minimale (asyncio, nessuna dipendenza).
+
+Ogni POST viene validato (percorso e X-Telegram-Bot-Api-Secret-Token), decodificato e messo
+con put_nowait nella coda update dell'Application: la risposta 200 parte subito.
+L'ingresso è limitato: se la coda più gli update già in elaborazione superano `max_backlog`
+si risponde 503 e Telegram riprova più tardi, invece di accumulare lavoro in RAM.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from telegram import Update
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY = 1 << 20        # un update non supera mai qualche decina di KB
+HEADER_TIMEOUT = 30       # secondi di inattività prima di chiudere una connessione keep-alive
+
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class WebhookServer:
+    def __init__(self, bot, update_queue: asyncio.Queue, path: str, secret: str, max_backlog: int, in_flight=None):
+        self.bot = bot
+        self.update_queue = update_queue
+        self.max_backlog = max_backlog
+        # Update già prelevati dalla coda ma non terminati (vedi concurrency.ChatSequencer.in_flight)
+        self._in_flight = in_flight or (lambda: 0)
+        self.path = path
+        self.secret = secret.encode()
+        self.accepted = 0
+        self.rejected = 0
+        self._server = None
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info(f"Webhook in ascolto su {host}:{port}{self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _accept(self, body: bytes) -> int:
+        if self.update_queue.qsize() + self._in_flight() >= self.max_backlog:
+            self.rejected += 1
+            return 503
+        try:
+            update = Update.de_json(json.loads(body), self.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Update webhook non valido: {str(e)}")
+            return 400
+        try:
+            self.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return 503
+        self.accepted += 1
+        return 200
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEADER_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    return
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, close=True)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", "0"))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > MAX_BODY:
+                    await self._respond(writer, 413, close=True)
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                if target.split("?", 1)[0] != self.path:
+                    status = 404
+                elif method != "POST":
+                    status = 405
+                elif not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode(), self.secret):
+                    status = 403
+                else:
+                    status = self._accept(body)
+
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                await self._respond(writer, status, close)
+                if close:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, close: bool):
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+
+async def run_webhook(app, on_startup, on_shutdown, allowed_updates=None):
+    """
+    Ciclo di vita completo in modalità webhook (sostituisce run_polling).
+    L'Application va costruita con .updater(None) e una update_queue limitata.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: si esce con KeyboardInterrupt
+
+    processor = app.update_processor
+    server = WebhookServer(
+        app.bot,
+        app.update_queue,
+        config.WEBHOOK_PATH,
+        config.WEBHOOK_SECRET,
+        max_backlog=config.WEBHOOK_QUEUE_SIZE,
+        in_flight=lambda: getattr(processor, "in_flight", 0),
+    )
+    await app.initialize()
+    # post_init/post_shutdown vengono chiamati solo da run_polling/run_webhook: qui a mano
+    await on_startup(app)
+    try:
+        await app.start()
+        await server.start(config.WEBHOOK_LISTEN, config.WEBHOOK_PORT)
+        await app.bot.set_webhook(
+            url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=allowed_updates,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+        )
+        logger.info("Webhook registrato su Telegram")
+        await stop.wait()
+    finally:
+        await server.stop()
+        logger.info(f"Webhook: {server.accepted} update accettati, {server.rejected} respinti (coda piena)")
+        if app.running:
+            await app.stop()
+        await on_shutdown(app)
+        await app.shutdown()